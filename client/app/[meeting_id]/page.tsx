@@ -1,8 +1,8 @@
 "use client";
-import React, { useState, useEffect, useRef, useCallback } from 'react';
+import React, { useState, useEffect, useRef, useCallback, useMemo } from 'react';
 import { usePathname, useRouter } from 'next/navigation';
-import { getMeeting, stopMeeting, deleteMeeting, renameMeeting } from '@/lib/api/meeting';
-import { Meeting } from '@/lib/api/interface';
+import { getMeeting, getMeetingSegments, stopMeeting, deleteMeeting, renameMeeting } from '@/lib/api/meeting';
+import { Meeting, TranscriptSegment, LiveState, TranscriptionStatus } from '@/lib/api/interface';
 import ActionAlert from '@/components/action-alert';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -11,8 +11,10 @@ import { SidebarTrigger } from '@/components/ui/sidebar';
 import Markdown from 'react-markdown'
 import { Switch } from '@/components/ui/switch';
 import { Label } from '@/components/ui/label';
-import { postChat } from '@/lib/api/chat';
+import { postChat, getMeetingChat, postMeetingChat } from '@/lib/api/chat';
+import { enrollSpeaker } from '@/lib/api/speakers';
 
+const SEGMENT_PAGE_SIZE = 200;
 
 export default function MeetingPage() {
   const pathname = usePathname();
@@ -21,6 +23,9 @@ export default function MeetingPage() {
 
   const [meeting, setMeeting] = useState<Meeting | null>(null);
   const [liveTranscript, setLiveTranscript] = useState('');
+  const [transcriptionStatus, setTranscriptionStatus] = useState<TranscriptionStatus | null>(null);
+  const [segments, setSegments] = useState<TranscriptSegment[]>([]);
+  const [hasMoreSegments, setHasMoreSegments] = useState(false);
   const [isEditingTitle, setIsEditingTitle] = useState(false);
   const [newTitle, setNewTitle] = useState(meeting?.title || '');
   const [wordIndex, setWordIndex] = useState<number | null>(null); // State to store wordIndex
@@ -35,6 +40,9 @@ export default function MeetingPage() {
 
   const liveTranscriptEndRef = useRef<HTMLDivElement | null>(null);
 
+  // Split once per websocket update, the server uses the same indexes
+  const liveWords = useMemo(() => liveTranscript.split(/\s+/), [liveTranscript]);
+
   useEffect(() => {
     if (!meetingId) return; // Ensure meetingId is available
 
@@ -43,24 +51,44 @@ export default function MeetingPage() {
       try {
         const meetingData = await getMeeting(Number(meetingId));
         setMeeting(meetingData);
-        setMessages([{
-          role: 'system',
-          content: 'You are a helpful AI assistant. Please use the following transcript to answer any questions you are asked: ' + meetingData.transcript || 'No transcript available'
-        }]);
+        if (meetingData.status === 'COMPLETED') {
+          // Only the first page of the transcript, the rest is loaded on demand
+          const page = await getMeetingSegments(Number(meetingId), { limit: SEGMENT_PAGE_SIZE });
+          setSegments(page);
+          setHasMoreSegments(page.length === SEGMENT_PAGE_SIZE);
+        }
       } catch (error) {
         console.error('Error fetching meeting:', error);
       }
     };
 
+    // Chat history is stored per meeting on the server
+    const fetchChat = async () => {
+      try {
+        const chat = await getMeetingChat(Number(meetingId));
+        setMessages(chat.messages.map(({ role, content }) => ({ role, content })));
+      } catch (error) {
+        console.error('Error fetching chat:', error);
+      }
+    };
+
     fetchMeeting();
+    fetchChat();
   }, [meetingId]);
 
   useEffect(() => {
     if (meeting?.status === 'ACTIVE' && meetingId) {
-      const ws = new WebSocket(`ws://localhost:8080/meetings/${meetingId}`);
+      const ws = new WebSocket(`ws://localhost:8080/meetings/${meetingId}?format=json`);
 
       ws.onmessage = (event) => {
-        setLiveTranscript(event.data);
+        try {
+          const state: LiveState = JSON.parse(event.data);
+          setLiveTranscript(state.transcript);
+          setTranscriptionStatus(state.status);
+        } catch {
+          // Plain text, e.g. when the meeting isn't running
+          setLiveTranscript(event.data);
+        }
       };
 
       return () => {
@@ -69,6 +97,34 @@ export default function MeetingPage() {
     }
   }, [meeting?.status, meetingId, meeting?.start_time]);
 
+  const loadMoreSegments = async () => {
+    const lastSeq = segments.length ? segments[segments.length - 1].seq : -1;
+    try {
+      const page = await getMeetingSegments(Number(meetingId), { seq_start: lastSeq + 1, limit: SEGMENT_PAGE_SIZE });
+      setSegments((prevSegments) => [...prevSegments, ...page]);
+      setHasMoreSegments(page.length === SEGMENT_PAGE_SIZE);
+    } catch (error) {
+      console.error('Error loading transcript segments:', error);
+    }
+  };
+
+  // Names every segment with this label and enrolls the voice, later meetings get the name automatically
+  const handleNameSpeaker = async (segment: TranscriptSegment) => {
+    const name = window.prompt('Who is speaking?', segment.speaker || '')?.trim();
+    if (!name || name === segment.speaker) return;
+    try {
+      const request = segment.speaker
+        ? { name, meeting_id: Number(meetingId), speaker: segment.speaker }
+        : { name, meeting_id: Number(meetingId), seqs: [segment.seq] };
+      await enrollSpeaker(request);
+      setSegments((prevSegments) => prevSegments.map((s) =>
+        (segment.speaker ? s.speaker === segment.speaker : s.seq === segment.seq) ? { ...s, speaker: name } : s
+      ));
+    } catch (error) {
+      console.error('Error enrolling speaker:', error);
+    }
+  };
+
   const handleTitleChange = async () => {
     try {
       const updatedMeeting = await renameMeeting(Number(meetingId), newTitle);
@@ -98,19 +154,29 @@ export default function MeetingPage() {
   };
 
   // Function to send text to chat endpoint
-  const sendToChat = useCallback(async (text: string, use_image: boolean, use_reasoning: boolean, questionType?: string) => {
-    const data = await postChat(text, use_image, use_reasoning, questionType)
-    setResponse(data.response);
-    setQuestionType(data.question_type)
-  }, []);
+  // Only the latest click matters, aborting the previous request lets the server cancel its provider call
+  const chatController = useRef<AbortController | null>(null);
+
+  const sendToChat = useCallback(async (index: number, use_image: boolean, use_reasoning: boolean, questionType?: string) => {
+    chatController.current?.abort();
+    const controller = new AbortController();
+    chatController.current = controller;
+    try {
+      const data = await postChat(Number(meetingId), index, use_image, use_reasoning, questionType, undefined, controller.signal)
+      setResponse(data.response);
+      setQuestionType(data.question_type)
+    } catch (error) {
+      // Superseded by a newer click (aborted here, or 409 from the server)
+      if (controller.signal.aborted || chatController.current !== controller) return;
+      console.error('Error sending to chat:', error);
+    }
+  }, [meetingId]);
 
   // Handle word click in transcript
   const handleWordClick = (index: number) => {
-    const words = liveTranscript.split(/\s+/);
-    if (index >= words.length) return;
-    const conversation = words.slice(index).join(' ');
+    if (index >= liveWords.length) return;
     setWordIndex(index); // Save the wordIndex
-    sendToChat(conversation, useImage, useReasoning);
+    sendToChat(index, useImage, useReasoning);
   };
 
   useEffect(() => {
@@ -122,9 +188,7 @@ export default function MeetingPage() {
 
   const handleButtonClick = (questionType: string) => {
     if (wordIndex !== null) {
-      const words = liveTranscript.split(/\s+/);
-      const conversation = words.slice(wordIndex).join(' ');
-      sendToChat(conversation, useImage, useReasoning, questionType);
+      sendToChat(wordIndex, useImage, useReasoning, questionType);
     }
   };
 
@@ -134,19 +198,10 @@ export default function MeetingPage() {
     const newMessage = { role: 'user', content: inputText };
     setMessages((prevMessages) => [...prevMessages, newMessage]);
     setInputText('');
-    console.log(messages)
     try {
-      const response = await fetch('http://localhost:8080/chat/completions', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ messages: [...messages, newMessage] }),
-      });
-
-      const data = await response.json();
-      console.log(data)
-      const botMessage = { role: 'assistant', content: data };
+      // The server adds the transcript and the earlier messages
+      const data = await postMeetingChat(Number(meetingId), newMessage.content);
+      const botMessage = { role: data.role, content: data.content };
 
       setMessages((prevMessages) => [...prevMessages, botMessage]);
     } catch (error) {
@@ -240,20 +295,32 @@ export default function MeetingPage() {
                   <div className="p-2">
                     <h2 className="font-bold text-2xl">Transcript</h2>
                     <div>
-                        {JSON.parse(meeting.transcript).map((entry: any, index: number) => (
-                        <React.Fragment key={index}>
-                          <p className="font-bold">{entry.speaker}</p>
-                          <p>{entry.text}</p>
+                        {segments.map((segment) => (
+                        <React.Fragment key={segment.seq}>
+                          <p className="font-bold cursor-pointer hover:underline" title="Name this speaker" onClick={() => handleNameSpeaker(segment)}>
+                            {segment.speaker || 'Unknown'}
+                          </p>
+                          <p>{segment.text}</p>
                         </React.Fragment>
                         ))}
+                        {hasMoreSegments && (
+                          <Button variant="secondary" className="border border-primary" onClick={loadMoreSegments}>
+                            Load more
+                          </Button>
+                        )}
                     </div>
                   </div>
                 </div>
               ) : meeting.status === 'ACTIVE' ? (
                 <div className="p-2 w-full">
                   <h2 className="font-bold">Transcript</h2>
+                  {transcriptionStatus?.state === 'behind' && (
+                    <p className="text-sm text-muted-foreground">
+                      Falling behind, {Math.round(transcriptionStatus.backlog_seconds)}s of audio waiting to be transcribed
+                    </p>
+                  )}
                   <div>
-                    {liveTranscript.split(/\s+/).map((word, index) => (
+                    {liveWords.map((word, index) => (
                       <span
                         key={index}
                         className="hover:bg-secondary cursor-pointer"
@@ -10,7 +10,7 @@ import { Select, SelectTrigger, SelectValue, SelectContent, SelectItem } from "@
 import { Plus, Tag as LucideTag, Trash2, ChevronDown, ChevronRight } from "lucide-react";
 import { getAudioDevices, getAudioConfigurations } from "@/lib/api/audio";
 import { getTags, createTag, deleteTag } from "@/lib/api/tags";
-import { AudioDevice, AudioConfig, Tag } from "@/lib/api/interface";
+import { AudioDevice, AudioConfig, InputDevice, Tag } from "@/lib/api/interface";
 import { createAudioConfiguration } from "@/lib/api/audio"; // Import the API function
 import ActionAlert from "@/components/action-alert";
 import { getSettings, saveSetting } from '@/lib/api/chat';
@@ -20,7 +20,7 @@ export default function SettingsPage() {
   const [tags, setTags] = useState<Tag[]>([]);
   const [newTag, setNewTag] = useState("");
   // Audio Settings
-  const [audioDevices, setAudioDevices] = useState<AudioDevice[]>([]);
+  const [audioDevices, setAudioDevices] = useState<(AudioDevice & InputDevice)[]>([]);
   const [selectedCompany, setSelectedCompany] = useState("");
   const [selectedDevices, setSelectedDevices] = useState<{ name: string; channel: number }[]>([]);
   const [audioConfigurations, setAudioConfigurations] = useState<AudioConfig[]>([]);
@@ -42,10 +42,11 @@ export default function SettingsPage() {
 
         setTags(tags);
 
-        const devices = Object.entries(audioDevices).map(([name, n_channels]) => ({
+        const devices = Object.entries(audioDevices).map(([name, { n_channels, sample_rate }]) => ({
           name,
           channel: 0,
-          n_channels: Number(n_channels),
+          n_channels,
+          sample_rate,
         }));
         setAudioDevices(devices);
 
@@ -223,7 +224,7 @@ export default function SettingsPage() {
                           <SelectContent>
                             {audioDevices.map((audioDevice) => (
                               <SelectItem key={audioDevice.name} value={audioDevice.name}>
-                                {audioDevice.name}
+                                {audioDevice.name} ({audioDevice.sample_rate / 1000} kHz)
                               </SelectItem>
                             ))}
                           </SelectContent>
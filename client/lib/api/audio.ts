@@ -1,8 +1,8 @@
 import { get, post } from "./http";
-import { AudioConfig, AudioDevice } from "./interface";
+import { AudioConfig, AudioDevice, InputDevice } from "./interface";
 
-export async function getAudioDevices(): Promise<Record<string, number>> {
-  return await get<Record<string, number>>("http://localhost:8080/audio-devices");
+export async function getAudioDevices(): Promise<Record<string, InputDevice>> {
+  return await get<Record<string, InputDevice>>("http://localhost:8080/audio-devices");
 }
 
 export async function getAudioConfigurations(): Promise<AudioConfig[]> {
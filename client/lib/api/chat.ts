@@ -1,5 +1,5 @@
-import { get, post } from "./http";
-import { Setting, AudioConfig, ChatResponse } from "./interface";
+import { get, post, del } from "./http";
+import { Setting, AudioConfig, ChatResponse, ChatMessage, ChatSession } from "./interface";
 
 export async function getSettings(): Promise<Setting[]> {
   return await get<Setting[]>("http://localhost:8080/settings");
@@ -9,18 +9,39 @@ export async function saveSetting(setting: Setting): Promise<Setting> {
   return await post<Setting, Setting>("http://localhost:8080/settings", setting);
 }
 
+// The server slices the meeting's transcript from wordIndex (words split on /\s+/), only the indexes are sent
 export async function postChat(
-  text: string,
+  meetingId: number,
+  wordIndex: number,
   use_image: boolean,
   use_reasoning: boolean,
-  questionType?: string
+  questionType?: string,
+  wordEnd?: number,
+  signal?: AbortSignal
 ): Promise<ChatResponse> {
-  return await post<ChatResponse, { conversation: string; question_type?: string; use_image: boolean; use_reasoning: boolean }>(
+  return await post<ChatResponse, { meeting_id: number; word_index: number; word_end?: number; question_type?: string; use_image: boolean; use_reasoning: boolean }>(
     "http://localhost:8080/chat",
-    { conversation: text, question_type: questionType, use_image, use_reasoning }
+    { meeting_id: meetingId, word_index: wordIndex, word_end: wordEnd, question_type: questionType, use_image, use_reasoning },
+    { signal }
   );
 }
 
+// Chat history is kept on the server, only the new message is sent
+export async function getMeetingChat(meetingId: number): Promise<ChatSession> {
+  return await get<ChatSession>(`http://localhost:8080/meetings/${meetingId}/chat`);
+}
+
+export async function postMeetingChat(meetingId: number, content: string): Promise<ChatMessage> {
+  return await post<ChatMessage, { content: string }>(
+    `http://localhost:8080/meetings/${meetingId}/chat`,
+    { content }
+  );
+}
+
+export async function deleteMeetingChat(meetingId: number): Promise<{ message: string }> {
+  return await del<{ message: string }>(`http://localhost:8080/meetings/${meetingId}/chat`);
+}
+
 export async function getAudioConfigurationById(audioId: number): Promise<AudioConfig> {
   return await get<AudioConfig>(`http://localhost:8080/audio/${audioId}`);
 }
@@ -4,6 +4,12 @@ export interface AudioDevice {
   n_channels: number
 }
 
+// A device as reported by /audio-devices, captured at its native rate and resampled to 16kHz
+export interface InputDevice {
+  n_channels: number
+  sample_rate: number
+}
+
 export interface AudioConfig {
   company: string
   audio_id: number
@@ -23,16 +29,56 @@ export interface Meeting {
   start_time: string;
   end_time: string;
   audio_file: string | null;
-  transcript: string;
+  transcript: string | null;
   summary: string;
   tags: Tag[];
 }
 
+export interface TranscriptSegment {
+  seq: number;
+  start: number | null;
+  end: number | null;
+  speaker: string | null;
+  text: string;
+}
+
+export interface Speaker {
+  speaker_id: number;
+  name: string;
+  n_segments: number;
+}
+
+export interface TranscriptionStatus {
+  state: 'ok' | 'behind';
+  backlog_seconds: number;
+  decode_interval: number;
+  real_time_factor: number | null;
+  skipped_ticks: number;
+  dropped_seconds: number;
+}
+
+export interface LiveState {
+  transcript: string;
+  status: TranscriptionStatus;
+}
+
 export interface Setting {
   key: string;
   value: string;
 }
 
+export interface ChatMessage {
+  seq: number;
+  role: string;
+  content: string;
+}
+
+export interface ChatSession {
+  meeting_id: number;
+  summary: string | null;
+  messages: ChatMessage[];
+}
+
 export interface ChatResponse {
   response: string;
   question_type: string;
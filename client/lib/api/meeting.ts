@@ -1,5 +1,5 @@
 import { get, post, del } from './http';
-import { Meeting, Tag } from './interface';
+import { Meeting, Tag, TranscriptSegment } from './interface';
 
 export async function startMeeting(audio_id: number): Promise<Meeting> {
   return post<Meeting>(`http://localhost:8080/meetings/start`, { audio_id });
@@ -13,8 +13,19 @@ export async function renameMeeting(meeting_id: number, title: string): Promise<
   return post<Meeting>(`http://localhost:8080/meetings/${meeting_id}`, { title });
 }
 
-export async function getMeeting(meeting_id: number): Promise<Meeting> {
-  return get<Meeting>(`http://localhost:8080/meetings/${meeting_id}`);
+export async function getMeeting(meeting_id: number, includeTranscript: boolean = false): Promise<Meeting> {
+  return get<Meeting>(`http://localhost:8080/meetings/${meeting_id}?include_transcript=${includeTranscript}`);
+}
+
+export async function getMeetingSegments(
+  meeting_id: number,
+  params: { start?: number; end?: number; seq_start?: number; seq_end?: number; speaker?: string; limit?: number } = {}
+): Promise<TranscriptSegment[]> {
+  const queryParams = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined) queryParams.append(key, value.toString());
+  });
+  return get<TranscriptSegment[]>(`http://localhost:8080/meetings/${meeting_id}/segments?${queryParams.toString()}`);
 }
 
 export async function getMeetings(page: number, tags: string[]): Promise<Meeting[]> {
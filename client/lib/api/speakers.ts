@@ -0,0 +1,15 @@
+import { get, post, del } from './http';
+import { Speaker } from './interface';
+
+export async function getSpeakers(): Promise<Speaker[]> {
+  return get<Speaker[]>(`http://localhost:8080/speakers`);
+}
+
+// Enrolls from a meeting's segments, by their current speaker label or by seq, and renames them
+export async function enrollSpeaker(request: { name: string; meeting_id: number; speaker?: string; seqs?: number[] }): Promise<Speaker> {
+  return post<Speaker>(`http://localhost:8080/speakers`, request);
+}
+
+export async function deleteSpeaker(speaker_id: number): Promise<void> {
+  return del<void>(`http://localhost:8080/speakers/${speaker_id}`);
+}
@@ -0,0 +1,89 @@
+from library.config import get_config
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from models.database import Base, engine, async_engine
+from models.migrations import run_migrations
+from routers import audio_router, tag_router, meeting_router, chat_router, health_router, metrics_router, speaker_router, admin_router
+from library.metrics import instrument_engine
+from library.responses import CompressionMiddleware
+from services.model_registry import registry
+from services.device_registry import device_registry
+from services.provider_scheduler import ProviderQueueTimeout
+from services.profiler import LoopLagMonitor
+import asyncio
+from fastapi.middleware.cors import CORSMiddleware
+
+config = get_config()
+SESSION_REGISTRY = config.get('SESSION_REGISTRY', 'local')
+
+# Initialize FastAPI app
+app = FastAPI()
+
+# Create database tables
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+# Time every DB query for /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Include audio router
+app.include_router(audio_router.router)
+
+# Include tag router
+app.include_router(tag_router.router)
+
+# Include meeting router
+app.include_router(meeting_router.router)
+
+# Include chat router
+app.include_router(chat_router.router)
+
+# Include speaker router
+app.include_router(speaker_router.router)
+
+# Include health router
+app.include_router(health_router.router)
+
+# Include metrics router
+app.include_router(metrics_router.router)
+
+# Include admin router
+app.include_router(admin_router.router)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to restrict origins if needed
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Brotli or gzip for large responses, meetings with transcripts are mostly text
+app.add_middleware(CompressionMiddleware)
+
+# Provider quota didn't free up in time, tell the client when to try again
+@app.exception_handler(ProviderQueueTimeout)
+async def provider_queue_timeout(request: Request, exc: ProviderQueueTimeout):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(int(exc.retry_after) + 1)})
+
+# Resume or finalize meetings that were live when the server went down
+@app.on_event("startup")
+async def startup():
+    # Logs whatever blocks the API's event loop
+    LoopLagMonitor("api").start(asyncio.get_running_loop())
+    # Load models in the background so the server can take requests right away,
+    # the supervisor loads the ASR models itself
+    warmup_models = config.get('WARMUP_MODELS', ['asr'])
+    if SESSION_REGISTRY == 'supervisor':
+        warmup_models = [name for name in warmup_models if not name.startswith('asr')]
+    registry.warmup(warmup_models)
+    # Initialize PortAudio once up front instead of on the first meeting start
+    await asyncio.to_thread(device_registry.refresh)
+    await meeting_router.recover_meetings()
+
+# Example route
+@app.get("/")
+def read_root():
+    return {"message": "Server is running on port 8080!"}
@@ -0,0 +1,147 @@
+"""
+Load generator for the chat endpoints.
+
+Sends requests to /chat, /chat/completions and /meetings/{id}/summarize at a fixed rate
+(open loop, a slow server doesn't slow the arrivals down) and reports latency percentiles,
+throughput and errors per endpoint as JSON. Run it against a server whose providers point at
+benchmarks.stub_provider to measure the server itself rather than the provider.
+
+Run from the server directory, with the server already running:
+    python -m benchmarks.stub_provider --port 8090 &
+    python -m benchmarks.chat_load --rate 20 --duration 30
+    python -m benchmarks.chat_load --targets summarize --meeting-id 3 --rate 2
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from collections import Counter
+import httpx
+import numpy as np
+
+CONVERSATION = ("Interviewer: Thanks for joining. Can you walk me through how you would design a rate limiter "
+                "for a public API that has both free and paid tiers? Candidate: Sure, so I would start with")
+
+def percentile(values, p):
+    return round(float(np.percentile(values, p)), 4) if values else None
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_request(target, args):
+    """
+    :return: (method, path, json body) for one request to target
+    """
+    if target == "chat":
+        body = {"conversation": CONVERSATION, "question_type": args.question_type}
+        return "POST", "/chat", body
+    if target == "completions":
+        return "POST", "/chat/completions", {"messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": CONVERSATION},
+        ]}
+    if target == "summarize":
+        return "POST", f"/meetings/{args.meeting_id}/summarize", None
+    raise ValueError(f"Unknown target '{target}'")
+
+async def send(client, target, args, results, semaphore):
+    method, path, body = make_request(target, args)
+    queued = time.perf_counter()
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+    end = time.perf_counter()
+    # Latency includes the time spent waiting for a connection, like a real client would see
+    results[target].append({"status": status, "latency": end - queued, "service": end - start, "end": end})
+
+def summarize_results(samples, duration):
+    ok = [sample for sample in samples if sample["status"] == 200]
+    latencies = [sample["latency"] for sample in ok]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": dict(Counter(str(sample["status"]) for sample in samples if sample["status"] != 200)),
+        "throughput_per_second": round(len(ok) / duration, 3) if duration else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": percentile(latencies, 100),
+        },
+    }
+
+async def main(args):
+    targets = args.targets.split(',')
+    if "summarize" in targets and args.meeting_id is None:
+        raise SystemExit("--meeting-id is required for the summarize target")
+
+    results = {target: [] for target in targets}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    rng = random.Random(args.seed)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        n_requests = int(args.rate * args.duration)
+        for i in range(n_requests):
+            # Evenly spaced, or Poisson arrivals which are closer to real users
+            delay = start + i / args.rate - time.perf_counter() if not args.poisson else rng.expovariate(args.rate)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            target = targets[i % len(targets)]
+            tasks.append(asyncio.create_task(send(client, target, args, results, semaphore)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+
+    report = {
+        "benchmark": "chat_load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "url": args.url,
+        "rate_per_second": args.rate,
+        "concurrency": args.concurrency,
+        "duration_seconds": round(duration, 3),
+        "targets": {target: summarize_results(samples, duration) for target, samples in results.items()},
+    }
+    all_samples = [sample for samples in results.values() for sample in samples]
+    report["total"] = summarize_results(all_samples, duration)
+    for target, result in report["targets"].items():
+        print(f"{target}: {result['ok']}/{result['requests']} ok, p95 {result['latency_seconds']['p95']}s, "
+              f"{result['throughput_per_second']}/s", file=sys.stderr)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints.")
+    parser.add_argument("--url", default="http://localhost:8080", help="Server URL (default: http://localhost:8080)")
+    parser.add_argument("--targets", default="chat,completions", help="Comma separated: chat, completions, summarize (default: chat,completions)")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second across all targets (default: 10)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to send requests for (default: 30)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Most requests in flight at once (default: 256)")
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of evenly spaced requests")
+    parser.add_argument("--question-type", default="trivia", help="question_type sent to /chat, 'null' to also classify (default: trivia)")
+    parser.add_argument("--meeting-id", type=int, help="Meeting to summarize for the summarize target")
+    parser.add_argument("--timeout", type=float, default=120, help="Request timeout in seconds (default: 120)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for Poisson arrivals")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    if args.question_type == "null":
+        args.question_type = None
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,207 @@
+"""
+End-to-end benchmark of the live transcription pipeline.
+
+Drives AudioService with a replayed recording or synthetic speech and reports, per level
+of concurrency: speech-to-websocket latency, real-time factor, decode calls per audio second,
+CPU and RSS per meeting. Ramps the number of concurrent meetings to find the most the
+machine can sustain. Results are printed (or written) as JSON to compare between versions.
+
+Run from the server directory:
+    python -m benchmarks.live_pipeline --asr stub --seconds 30
+    python -m benchmarks.live_pipeline --audio replays/interview.wav --asr whisper-int8 --model base.en
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+from services.audio_service import AudioService
+from services.asr_backends import create_asr_backend, StubBackend
+from services.capture_sources import FileReplaySource, load_audio_file
+from services.transcript_journal import remove_journal
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 1024
+
+def synthetic_speech(seconds, seed=0):
+    """
+    Noise bursts shaped like speech: 1-4s utterances at a syllable rate of ~4Hz,
+    separated by 0.5-2s pauses. Enough for VAD and the stub ASR, whisper will decode gibberish.
+    """
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position = int(rng.uniform(.5, 1) * SAMPLE_RATE)
+    while position < len(audio):
+        length = min(int(rng.uniform(1, 4) * SAMPLE_RATE), len(audio) - position)
+        t = np.arange(length) / SAMPLE_RATE
+        envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+        audio[position:position + length] = rng.normal(0, .3, length) * envelope
+        position += length + int(rng.uniform(.5, 2) * SAMPLE_RATE)
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+
+def percentile(values, p):
+    return round(float(np.percentile(values, p)), 4) if values else None
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # Peak instead of current outside Linux, KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 2**10
+
+async def run_level(n_meetings, samples, args, asr_backend, output_dir):
+    """
+    Runs n_meetings concurrent meetings replaying samples and measures them
+    """
+    services = []
+    for i in range(n_meetings):
+        source = FileReplaySource(args.audio or "synthetic", SAMPLE_RATE, FRAME_SIZE, speed=args.speed, samples=samples)
+        service = AudioService([], asr_backend, f"bench-{n_meetings}-{i}", output_dir=output_dir, source=source)
+        services.append(service)
+
+    rss_before = rss_mb()
+    cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.monotonic()
+    for service in services:
+        asyncio.create_task(service.start())
+
+    # Poll like the websocket does and time how long new text takes to show up
+    latencies = []
+    last_text = ["" for _ in services]
+    audio_seconds = len(samples) / SAMPLE_RATE
+    deadline = wall_start + audio_seconds / (args.speed or 1) + args.drain
+    while time.monotonic() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        now = time.monotonic()
+        for i, service in enumerate(services):
+            text = service.get_transcription()
+            if text != last_text[i]:
+                last_text[i] = text
+                frame = service.decoded_until // FRAME_SIZE - 1
+                frame_times = service.source.frame_times
+                if 0 <= frame < len(frame_times):
+                    latencies.append(now - frame_times[frame])
+        if all(service.source.finished.is_set() for service in services) and \
+                all(service.decoded_until >= len(samples) - FRAME_SIZE for service in services):
+            break
+
+    wall = time.monotonic() - wall_start
+    cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+    rss_after = rss_mb()
+    for service in services:
+        await asyncio.to_thread(service.stop)
+        remove_journal(service.meeting_id)
+
+    decode_seconds = sum(service.decode_seconds for service in services)
+    decode_count = sum(service.decode_count for service in services)
+    audio_decoded = sum(service.samples_seen for service in services) / SAMPLE_RATE
+    audio_emitted = sum(service.source.frames_emitted for service in services) * FRAME_SIZE / SAMPLE_RATE
+    cpu_seconds = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+    # Audio that was captured but never transcribed when the run ended
+    backlog = max(service.source.frames_emitted * FRAME_SIZE - service.decoded_until for service in services) / SAMPLE_RATE
+
+    return {
+        "meetings": n_meetings,
+        "wall_seconds": round(wall, 3),
+        "audio_seconds_per_meeting": round(audio_seconds, 3),
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": percentile(latencies, 100),
+            "samples": len(latencies),
+        },
+        "real_time_factor": round(decode_seconds / audio_decoded, 4) if audio_decoded else None,
+        "decode_calls_per_audio_second": round(decode_count / audio_decoded, 3) if audio_decoded else None,
+        "cpu_percent_per_meeting": round(100 * cpu_seconds / wall / n_meetings, 2),
+        "rss_mb_per_meeting": round((rss_after - rss_before) / n_meetings, 2),
+        "rss_mb": round(rss_after, 1),
+        "audio_emitted_seconds": round(audio_emitted, 3),
+        "backlog_seconds": round(backlog, 3),
+    }
+
+def sustainable(result, args):
+    p95 = result["latency_seconds"]["p95"]
+    return p95 is not None and p95 <= args.max_latency and result["backlog_seconds"] <= args.max_backlog
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    if args.audio:
+        samples = load_audio_file(args.audio, SAMPLE_RATE)
+        if args.seconds:
+            samples = samples[:int(args.seconds * SAMPLE_RATE)]
+    else:
+        samples = synthetic_speech(args.seconds or 30, args.seed)
+
+    load_start = time.perf_counter()
+    if args.asr == "stub":
+        asr_backend = StubBackend(rtf=args.stub_rtf)
+    else:
+        asr_backend = create_asr_backend(args.model, backend=args.asr)
+    load_seconds = time.perf_counter() - load_start
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        n_meetings = 1
+        while n_meetings <= args.max_meetings:
+            result = await run_level(n_meetings, samples, args, asr_backend, output_dir)
+            result["sustainable"] = sustainable(result, args)
+            results.append(result)
+            print(f"{n_meetings} meetings: p95 latency {result['latency_seconds']['p95']}s, "
+                  f"RTF {result['real_time_factor']}, backlog {result['backlog_seconds']}s", file=sys.stderr)
+            if not result["sustainable"] or not args.ramp:
+                break
+            n_meetings *= 2
+
+    passing = [result["meetings"] for result in results if result["sustainable"]]
+    return {
+        "benchmark": "live_pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "asr": {"backend": args.asr, "model": args.model, "stub_rtf": args.stub_rtf, "load_seconds": round(load_seconds, 3)},
+        "input": {"audio": args.audio or "synthetic", "seconds": round(len(samples) / SAMPLE_RATE, 3), "speed": args.speed},
+        "criteria": {"max_p95_latency_seconds": args.max_latency, "max_backlog_seconds": args.max_backlog},
+        "max_sustainable_meetings": max(passing) if passing else 0,
+        "levels": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the live transcription pipeline.")
+    parser.add_argument("--audio", help="WAV/FLAC file to replay, synthetic speech if not set")
+    parser.add_argument("--seconds", type=float, help="Audio length to use (default: whole file, 30s synthetic)")
+    parser.add_argument("--asr", default="stub", help="ASR backend: stub, whisper or whisper-int8 (default: stub)")
+    parser.add_argument("--model", default="turbo", help="Model name for whisper backends (default: turbo)")
+    parser.add_argument("--stub-rtf", type=float, default=0, help="Decode time the stub ASR simulates, as a fraction of the audio decoded (default: 0)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 1 is real time (default: 1)")
+    parser.add_argument("--poll-interval", type=float, default=.1, help="Transcript poll interval in seconds (default: 0.1)")
+    parser.add_argument("--drain", type=float, default=5, help="Seconds to wait for transcription after the audio ends (default: 5)")
+    parser.add_argument("--ramp", action="store_true", help="Double the concurrent meetings until they are no longer sustainable")
+    parser.add_argument("--max-meetings", type=int, default=64, help="Upper bound when ramping (default: 64)")
+    parser.add_argument("--max-latency", type=float, default=3, help="p95 latency in seconds still considered sustainable (default: 3)")
+    parser.add_argument("--max-backlog", type=float, default=2, help="Untranscribed seconds at the end still considered sustainable (default: 2)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic speech")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,206 @@
+"""
+Serialization benchmark for the meeting views.
+
+Fills a scratch SQLite database with meetings that have hour-long transcripts and times
+GET /meetings and GET /meetings/{id} through the current routes (row dicts, orjson,
+compression, with and without the compression cache) and through the previous implementation
+(a MeetingTags model per meeting, one tag query per meeting, the default JSON encoder, no
+compression). Reports server CPU and wall time per request, bytes on the wire, and whether
+both return the same JSON.
+
+Run from the server directory:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --meetings 500 --minutes 90 --requests 10
+"""
+import os
+import gzip
+import json
+import time
+import asyncio
+import random
+import argparse
+import tempfile
+from typing import List
+from fastapi import FastAPI, APIRouter, Depends, Query
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session, defer
+from models.database import Base
+from models.models import Meeting, MeetingTag, Tag, StatusEnum
+from schemas.meeting_schema import MeetingTags
+from schemas.tag_schema import TagSchema
+from routers import meeting_router
+from library.responses import CompressionMiddleware, brotli
+
+WORDS_PER_MINUTE = 150
+VOCABULARY = ("the we should probably look at latency numbers before the launch so I think that "
+              "makes sense but what about the database migration and the rollout plan for next "
+              "quarter okay let me share my screen quickly can you see it now yes").split()
+
+def fill_database(db, n_meetings, minutes, n_tags):
+    rng = random.Random(0)
+    tags = [Tag(name=f"tag-{i}") for i in range(n_tags * 3)]
+    db.add_all(tags)
+    db.flush()
+    for i in range(n_meetings):
+        segments = []
+        for minute in range(minutes):
+            text = ' '.join(rng.choice(VOCABULARY) for _ in range(WORDS_PER_MINUTE))
+            segments.append({"speaker": f"SPEAKER_0{minute % 3}", "start": minute * 60.0, "end": minute * 60.0 + 60, "text": text})
+        meeting = Meeting(
+            title=f"Meeting {i}", status=StatusEnum.COMPLETED,
+            start_time=f"2025-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00", end_time=f"2025-01-{i % 28 + 1:02d}T{i % 24:02d}:59:00",
+            audio_file=f"./recordings/{i}.wav", transcript=json.dumps(segments),
+            summary='\n'.join(f"- {' '.join(rng.choice(VOCABULARY) for _ in range(25))}" for _ in range(12)),
+        )
+        db.add(meeting)
+        db.flush()
+        for tag in rng.sample(tags, n_tags):
+            db.add(MeetingTag(meeting_id=meeting.meeting_id, tag_id=tag.tag_id))
+    db.commit()
+
+def legacy_router(get_db):
+    """
+    The meeting views as they were before the fast path
+    """
+    router = APIRouter()
+
+    def create_meeting_tags_response(meeting, db, include_transcript=False):
+        tags = db.query(Tag).join(MeetingTag).filter(MeetingTag.meeting_id == meeting.meeting_id).all()
+        return MeetingTags(
+            meeting_id=meeting.meeting_id, title=meeting.title, audio_id=meeting.audio_id, status=meeting.status,
+            start_time=meeting.start_time, end_time=meeting.end_time, audio_file=meeting.audio_file,
+            transcript=meeting.transcript if include_transcript else None, summary=meeting.summary,
+            tags=[TagSchema(tag_id=tag.tag_id, name=tag.name) for tag in tags],
+        )
+
+    @router.get("/meetings", response_model=List[MeetingTags])
+    def get_all_meetings(db: Session = Depends(get_db), include_transcript: bool = Query(False)):
+        query = db.query(Meeting).order_by(Meeting.start_time.desc())
+        if not include_transcript:
+            query = query.options(defer(Meeting.transcript))
+        return [create_meeting_tags_response(meeting, db, include_transcript) for meeting in query.all()]
+
+    @router.get("/meetings/{meeting_id}", response_model=MeetingTags)
+    def get_meeting(meeting_id: int, include_transcript: bool = Query(False), db: Session = Depends(get_db)):
+        meeting = db.query(Meeting).filter(Meeting.meeting_id == meeting_id).first()
+        return create_meeting_tags_response(meeting, db, include_transcript)
+
+    return router
+
+async def get(app, path, accept_encoding):
+    """
+    Calls the ASGI app directly, so only the server's side of the request is timed
+    :return: (headers, body as sent)
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    messages = []
+    requested = asyncio.Event()
+
+    async def receive():
+        if requested.is_set():
+            # The client stays connected
+            await asyncio.Future()
+        requested.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    if messages[0]["status"] != 200:
+        raise RuntimeError(f"GET {path} returned {messages[0]['status']}")
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return headers, b''.join(message.get("body", b"") for message in messages[1:])
+
+def decode(headers, body):
+    encoding = headers.get("content-encoding")
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "br":
+        body = brotli.decompress(body)
+    return json.loads(body)
+
+async def measure(app, path, n_requests):
+    accept_encoding = "br, gzip" if brotli is not None else "gzip"
+    await get(app, path, accept_encoding)  # warm up
+    cpu, wall, wire = time.process_time(), time.perf_counter(), 0
+    for _ in range(n_requests):
+        headers, body = await get(app, path, accept_encoding)
+        wire += len(body)
+    return {
+        "cpu_ms": round((time.process_time() - cpu) / n_requests * 1000, 2),
+        "wall_ms": round((time.perf_counter() - wall) / n_requests * 1000, 2),
+        "bytes": wire // n_requests,
+        "encoding": headers.get("content-encoding", "identity"),
+    }, decode(headers, body)
+
+async def compare(before, after, after_cold, views, n_requests):
+    results = {}
+    for view, path in views.items():
+        before_stats, before_body = await measure(before, path, n_requests)
+        after_stats, after_body = await measure(after, path, n_requests)
+        cold_stats, _ = await measure(after_cold, path, n_requests)
+        results[view] = {
+            "before": before_stats,
+            "after": after_stats,
+            # Without the compression cache, every request compresses its body again
+            "after_cold": cold_stats,
+            "cpu_speedup": round(before_stats["cpu_ms"] / after_stats["cpu_ms"], 1) if after_stats["cpu_ms"] else None,
+            "size_ratio": round(after_stats["bytes"] / before_stats["bytes"], 3),
+            "identical": before_body == after_body,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meetings", type=int, default=200)
+    parser.add_argument("--minutes", type=int, default=60, help="Transcript length of each meeting")
+    parser.add_argument("--tags", type=int, default=3, help="Tags per meeting")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per view")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        SessionBench = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with SessionBench() as db:
+            fill_database(db, args.meetings, args.minutes, args.tags)
+
+        def get_db():
+            db = SessionBench()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        before = FastAPI()
+        before.include_router(legacy_router(get_db))
+        after = FastAPI()
+        after.include_router(meeting_router.router)
+        after.add_middleware(CompressionMiddleware)
+        after.dependency_overrides[meeting_router.get_db] = get_db
+        after_cold = FastAPI()
+        after_cold.include_router(meeting_router.router)
+        after_cold.add_middleware(CompressionMiddleware, cache_bytes=0)
+        after_cold.dependency_overrides[meeting_router.get_db] = get_db
+
+        views = {
+            "list": "/meetings",
+            "list_with_transcripts": "/meetings?include_transcript=true",
+            "detail": "/meetings/1",
+            "detail_with_transcript": "/meetings/1?include_transcript=true",
+        }
+        report = {"meetings": args.meetings, "transcript_minutes": args.minutes, "requests": args.requests,
+                  "brotli": brotli is not None}
+        report["views"] = asyncio.run(compare(before, after, after_cold, views, args.requests))
+        engine.dispose()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local stand-in for an OpenAI-compatible provider, to measure the server's own overhead
+and concurrency without spending provider quota.
+
+Point INSTANT_BASE_URL / REASONING_BASE_URL in config.yaml at it:
+    python -m benchmarks.stub_provider --port 8090 --latency 0.3 --tokens-per-second 400
+    INSTANT_BASE_URL: http://localhost:8090/v1
+
+Supports streaming, tool calls (for instructor's classification), usage and
+x-ratelimit-* headers, per-minute request/token limits and random error injection.
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import deque
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("the system stores each request in a queue and a worker pool processes them in order "
+         "so that latency stays bounded while throughput scales with the number of workers").split()
+
+app = FastAPI()
+options = argparse.Namespace(latency=.2, jitter=0, tokens_per_second=200, output_tokens=120,
+                             error_rate=0, error_status=500, rpm=0, tpm=0)
+# (time, tokens) of requests in the last minute, for the rate limits
+recent = deque()
+
+def count_tokens(messages):
+    # Roughly 4 characters per token, close enough for rate limiting
+    text = ''.join(m['content'] if isinstance(m.get('content'), str) else json.dumps(m.get('content')) for m in messages)
+    return max(1, len(text) // 4)
+
+def fake_from_schema(schema, defs):
+    """
+    Smallest value that validates against a JSON schema, so instructor's tool calls parse
+    """
+    if '$ref' in schema:
+        return fake_from_schema(defs[schema['$ref'].split('/')[-1]], defs)
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if 'anyOf' in schema:
+        return fake_from_schema(schema['anyOf'][0], defs)
+    kind = schema.get('type')
+    if kind == 'object':
+        return {name: fake_from_schema(prop, defs) for name, prop in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [fake_from_schema(schema.get('items', {}), defs)]
+    if kind in ('integer', 'number'):
+        return 0
+    if kind == 'boolean':
+        return False
+    return "stub"
+
+def rate_limit_headers(now):
+    while recent and now - recent[0][0] > 60:
+        recent.popleft()
+    headers = {}
+    if options.rpm:
+        headers['x-ratelimit-limit-requests'] = str(options.rpm)
+        headers['x-ratelimit-remaining-requests'] = str(max(0, options.rpm - len(recent)))
+        headers['x-ratelimit-reset-requests'] = f"{60 - (now - recent[0][0]) if recent else 0:.2f}s"
+    if options.tpm:
+        used = sum(tokens for _, tokens in recent)
+        headers['x-ratelimit-limit-tokens'] = str(options.tpm)
+        headers['x-ratelimit-remaining-tokens'] = str(max(0, options.tpm - used))
+        headers['x-ratelimit-reset-tokens'] = f"{60 - (now - recent[0][0]) if recent else 0:.2f}s"
+    return headers
+
+def over_limit(tokens):
+    if options.rpm and len(recent) >= options.rpm:
+        return True
+    return bool(options.tpm) and sum(t for _, t in recent) + tokens > options.tpm
+
+def error_response(status, message, headers=None):
+    return JSONResponse(status_code=status, headers=headers, content={"error": {"message": message, "type": "stub_error"}})
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt_tokens = count_tokens(body.get('messages', []))
+    now = time.monotonic()
+    headers = rate_limit_headers(now)
+    if over_limit(prompt_tokens + options.output_tokens):
+        headers['retry-after'] = headers.get('x-ratelimit-reset-requests', '1s').rstrip('s')
+        return error_response(429, "Rate limit reached", headers)
+    recent.append((now, prompt_tokens + options.output_tokens))
+    if options.error_rate and random.random() < options.error_rate:
+        return error_response(options.error_status, "Injected error", headers)
+
+    await asyncio.sleep(max(0, options.latency + random.uniform(-options.jitter, options.jitter)))
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = body.get('model', 'stub')
+    tools = body.get('tools')
+    tool_calls = None
+    content = ' '.join(WORDS[i % len(WORDS)] for i in range(options.output_tokens))
+    if tools:
+        function = tools[0]['function']
+        parameters = function.get('parameters', {})
+        arguments = fake_from_schema(parameters, parameters.get('$defs', {}))
+        tool_calls = [{"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                       "function": {"name": function['name'], "arguments": json.dumps(arguments)}}]
+        content = None
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": options.output_tokens,
+             "total_tokens": prompt_tokens + options.output_tokens}
+
+    if not body.get('stream'):
+        await asyncio.sleep(options.output_tokens / options.tokens_per_second)
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return JSONResponse(headers=headers, content={
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+            "usage": usage,
+        })
+
+    async def stream():
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        if tool_calls:
+            yield chunk({"tool_calls": [dict(tool_calls[0], index=0)]})
+        else:
+            for i in range(options.output_tokens):
+                await asyncio.sleep(1 / options.tokens_per_second)
+                yield chunk({"content": ("" if i == 0 else " ") + WORDS[i % len(WORDS)]})
+        yield chunk({}, "tool_calls" if tool_calls else "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible chat completions server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=.2, help="Seconds before the first token (default: 0.2)")
+    parser.add_argument("--jitter", type=float, default=0, help="Uniform +/- jitter on the latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Generation speed (default: 200)")
+    parser.add_argument("--output-tokens", type=int, default=120, help="Tokens per completion (default: 120)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests that fail (default: 0)")
+    parser.add_argument("--error-status", type=int, default=500, help="Status code of injected errors (default: 500)")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before returning 429, 0 for no limit")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute before returning 429, 0 for no limit")
+    options = parser.parse_args(namespace=options)
+    uvicorn.run(app, host="127.0.0.1", port=options.port, log_level="warning")
@@ -0,0 +1,12 @@
+import yaml
+from functools import lru_cache
+
+CONFIG_PATH = 'config.yaml'
+
+@lru_cache(maxsize=None)
+def get_config():
+    """
+    :return: config.yaml parsed once per process and shared by every module
+    """
+    with open(CONFIG_PATH, 'r') as file:
+        return yaml.safe_load(file)
@@ -0,0 +1,105 @@
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+# Buckets in seconds, from a fast DB query up to a slow reasoning model
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+SLOW_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 20, 40, 80)
+
+# Audio pipeline
+ASR_DECODE_SECONDS = Histogram("meetingai_asr_decode_seconds", "Time per ASR decode call", ["backend"], buckets=SLOW_BUCKETS)
+ASR_AUDIO_SECONDS = Counter("meetingai_asr_audio_seconds", "Seconds of captured audio consumed by the transcription loop")
+
+# Chat
+CHAT_STAGE_SECONDS = Histogram("meetingai_chat_stage_seconds", "Time per /chat stage", ["endpoint", "stage"], buckets=SLOW_BUCKETS)
+PROVIDER_REQUEST_SECONDS = Histogram("meetingai_provider_request_seconds", "Latency of LLM provider calls", ["provider", "kind"], buckets=SLOW_BUCKETS)
+PROVIDER_ERRORS = Counter("meetingai_provider_errors", "Failed LLM provider calls", ["provider", "kind"])
+PROVIDER_QUEUE_SECONDS = Histogram("meetingai_provider_queue_seconds", "Time calls wait for provider rate limit budget", ["provider", "priority"], buckets=SLOW_BUCKETS)
+PROVIDER_RATE_LIMITED = Counter("meetingai_provider_rate_limited", "429 responses from LLM providers", ["provider"])
+PROVIDER_HEDGES = Counter("meetingai_provider_hedges", "Hedged instant calls by which provider answered first", ["kind", "winner"])
+PROVIDER_FAILOVERS = Counter("meetingai_provider_failovers", "Instant calls retried on the next provider after an error", ["provider", "kind"])
+SPECULATIVE_CLASSIFICATIONS = Counter("meetingai_speculative_classifications", "Background utterance classifications (classified, failed) and /chat lookups (hit, miss)", ["result"])
+CHAT_FLIGHTS = Counter("meetingai_chat_flights", "/chat requests coalesced with an identical one in flight, or cancelled because they were superseded or the client disconnected", ["outcome"])
+
+# Event loops
+EVENT_LOOP_LAG = Histogram("meetingai_event_loop_lag_seconds", "How late the event loop woke up from a short sleep", ["loop"], buckets=FAST_BUCKETS)
+EVENT_LOOP_STALLS = Counter("meetingai_event_loop_stalls", "Times the event loop was blocked for longer than LOOP_LAG_THRESHOLD", ["loop"])
+
+# Database
+DB_QUERY_SECONDS = Histogram("meetingai_db_query_seconds", "Time per SQL statement", ["statement"], buckets=FAST_BUCKETS)
+
+def instrument_engine(engine):
+    """
+    Times every statement executed on a (sync) SQLAlchemy engine, pass async_engine.sync_engine for async ones
+    """
+    # The start time lives on the statement's execution context, a statement that raises never
+    # gets to after_cursor_execute and would leave it behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'query_start', None)
+        if start is not None:
+            DB_QUERY_SECONDS.labels(statement.split(None, 1)[0].upper()).observe(time.perf_counter() - start)
+
+@contextmanager
+def provider_call(provider, kind):
+    """
+    Times an LLM provider call and counts it as an error if it raises
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PROVIDER_ERRORS.labels(provider, kind).inc()
+        raise
+    finally:
+        PROVIDER_REQUEST_SECONDS.labels(provider, kind).observe(time.perf_counter() - start)
+
+class SessionCollector:
+    """
+    Per-session gauges read from the session registry at scrape time, so the audio loop
+    doesn't pay for them and ended meetings drop out. Works when the sessions live in
+    the supervisor process, which plain Gauges in the API workers couldn't follow.
+    """
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    def families(self):
+        return {
+            "queue_depth": GaugeMetricFamily("meetingai_audio_queue_depth", "Frames waiting in AudioService.data_queue", labels=["meeting_id"]),
+            "rtf": GaugeMetricFamily("meetingai_asr_real_time_factor", "Decode time over audio time per session, above 1 means falling behind", labels=["meeting_id"]),
+            "backlog": GaugeMetricFamily("meetingai_asr_backlog_seconds", "Audio captured but not transcribed yet", labels=["meeting_id"]),
+            "interval": GaugeMetricFamily("meetingai_asr_decode_interval_seconds", "Current time between decodes, stretched when decoding is slow", labels=["meeting_id"]),
+            "dropped": GaugeMetricFamily("meetingai_asr_dropped_seconds", "Audio skipped without live transcription because the session fell too far behind", labels=["meeting_id"]),
+            "overruns": GaugeMetricFamily("meetingai_capture_overrun_samples", "Samples dropped because a device buffer overflowed", labels=["meeting_id", "device"]),
+            "underruns": GaugeMetricFamily("meetingai_capture_underrun_samples", "Samples padded with silence because a device was late", labels=["meeting_id", "device"]),
+            "active": GaugeMetricFamily("meetingai_active_sessions", "Meetings with a running AudioService"),
+        }
+
+    def describe(self):
+        # Lets the registry check names without calling the supervisor
+        return list(self.families().values())
+
+    def collect(self):
+        families = self.families()
+        session_metrics = self.sessions.session_metrics()
+        families["active"].add_metric([], len(session_metrics))
+        for meeting_id, metrics in session_metrics.items():
+            meeting_id = str(meeting_id)
+            families["queue_depth"].add_metric([meeting_id], metrics["queue_depth"])
+            if metrics["audio_seconds"]:
+                families["rtf"].add_metric([meeting_id], metrics["decode_seconds"] / metrics["audio_seconds"])
+            transcription = metrics["transcription"]
+            families["backlog"].add_metric([meeting_id], transcription["backlog_seconds"])
+            families["interval"].add_metric([meeting_id], transcription["decode_interval"])
+            families["dropped"].add_metric([meeting_id], transcription["dropped_seconds"])
+            for device, stats in metrics["capture"].get('devices', {}).items():
+                families["overruns"].add_metric([meeting_id, device], stats['overruns'])
+                families["underruns"].add_metric([meeting_id, device], stats['underruns'])
+        return list(families.values())
@@ -235,4 +235,31 @@ Output Format
 ### Outline
 - Main Topic 1
     - Subtopic 1
-    - Subtopic 2"""
\ No newline at end of file
+    - Subtopic 2"""
+
+class MeetingChatPrompt(BasePrompt):
+    def __init__(self, transcript, summary=None):
+        super().__init__(transcript)
+        self.system_prompt = 'You are a helpful AI assistant. Please use the following transcript to answer any questions you are asked: ' + (transcript or 'No transcript available')
+        self.summary = summary
+
+    def get_messages(self):
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation with the user:\n{self.summary}"})
+        return messages
+
+
+class CompactPrompt(BasePrompt):
+    def __init__(self, summary, messages):
+        conversation = '\n\n'.join(f"{message['role']}: {message['content']}" for message in messages)
+        super().__init__(conversation)
+        self.system_prompt = "You compress chat histories so a conversation can continue without the full history."
+        self.prompt = f"""# Summary so far
+{summary or 'None'}
+
+# New messages
+{conversation}
+
+# Request
+Update the summary with the new messages. Keep every question asked, the key facts, decisions, numbers and code details of the answers, and anything the user asked to remember. Drop pleasantries and repetition. Reply with the summary only."""
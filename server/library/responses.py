@@ -0,0 +1,143 @@
+import gzip
+import threading
+from collections import OrderedDict
+import anyio
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from library.config import get_config
+
+config = get_config()
+
+# Smaller responses aren't worth the CPU, and the headers would eat most of the savings
+COMPRESS_MIN_BYTES = config.get('COMPRESS_MIN_BYTES', 1024)
+# Fast settings, higher levels cost several times the CPU for a few percent on transcripts
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 2
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Compressed copies of recent large bodies, the same meeting list or transcript is usually fetched again
+COMPRESS_CACHE_BYTES = config.get('COMPRESS_CACHE_BYTES', 64 * 1024 * 1024)
+COMPRESS_CACHE_MIN_BYTES = 16 * 1024
+
+try:
+    import brotli
+except ImportError:
+    # Optional, gzip only without it
+    brotli = None
+
+class FastJSONResponse(Response):
+    """
+    JSON through orjson, for routes that build plain dicts instead of going through a response_model
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+def choose_encoding(accept_encoding):
+    """
+    :return: "br", "gzip" or None for an Accept-Encoding header
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        coding, *params = [value.strip() for value in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0
+        if q > 0:
+            accepted.add(coding)
+    if brotli is not None and 'br' in accepted:
+        return "br"
+    if 'gzip' in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionCache:
+    """
+    LRU of compressed bodies keyed by encoding and body, up to max_bytes of bodies and
+    their compressed copies. A hit costs a hash and a compare instead of compressing again.
+    """
+    def __init__(self, max_bytes=COMPRESS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # (encoding, hash, length) -> (body, compressed)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def compress(self, body, encoding):
+        if self.max_bytes <= 0 or len(body) < COMPRESS_CACHE_MIN_BYTES:
+            return compress(body, encoding)
+        key = (encoding, hash(body), len(body))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == body:
+                self.entries.move_to_end(key)
+                return entry[1]
+        compressed = compress(body, encoding)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (body, compressed)
+                self.size += len(body) + len(compressed)
+            while self.size > self.max_bytes and self.entries:
+                _, (old_body, old_compressed) = self.entries.popitem(last=False)
+                self.size -= len(old_body) + len(old_compressed)
+        return compressed
+
+class CompressionMiddleware:
+    """
+    Brotli (when installed) or gzip for responses of at least minimum_size bytes, e.g. meetings
+    with their transcripts. Only whole bodies are compressed, streamed responses and websockets
+    pass through untouched. Large bodies that were sent recently are served from CompressionCache.
+    """
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES, cache_bytes=COMPRESS_CACHE_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = CompressionCache(cache_bytes)
+
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it's worth compressing
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = MutableHeaders(raw=response_start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                await send(response_start)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESS_CACHE_MIN_BYTES:
+                # Multi-MB transcripts take milliseconds to compress, keep that off the event loop
+                body = await anyio.to_thread.run_sync(self.cache.compress, body, encoding)
+            else:
+                body = self.cache.compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(response_start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,59 @@
+import re
+
+WHITESPACE = re.compile(r'\s+')
+
+class WordIndex:
+    """
+    Word offsets over an append-only transcript, split the way the client does with
+    text.split(/\s+/), so a word index from the client slices the same words here.
+    slice() returns ' '.join(words[start:end]) without joining the words on every call.
+    """
+    def __init__(self, text=''):
+        self.text = ''  # words joined by single spaces
+        self.starts = [0]  # offset of each word in self.text, ''.split(/\s+/) is ['']
+        self.ends_with_space = False
+        self.append(text)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _parts(self, text):
+        parts = WHITESPACE.split(text)
+        # A whitespace run spanning the end of the text and the start of the new text is one separator
+        if len(parts) > 1 and parts[0] == '' and self.ends_with_space:
+            parts = parts[1:]
+        return parts
+
+    def append(self, text):
+        if not text:
+            return
+        parts = self._parts(text)
+        # The first part continues the last word
+        self.text += parts[0]
+        for part in parts[1:]:
+            self.starts.append(len(self.text) + 1)
+            self.text += ' ' + part
+        self.ends_with_space = WHITESPACE.fullmatch(text[-1]) is not None
+
+    def slice(self, start, end=None, tail=''):
+        """
+        :param tail: text treated as appended without storing it, e.g. the phrase still being transcribed
+        :return: ' '.join(words[start:end]) of the indexed text followed by tail
+        """
+        tail_text, tail_starts = '', []
+        if tail:
+            parts = self._parts(tail)
+            tail_text = parts[0]
+            for part in parts[1:]:
+                tail_starts.append(len(self.text) + len(tail_text) + 1)
+                tail_text += ' ' + part
+
+        n_words = len(self.starts) + len(tail_starts)
+        start, end, _ = slice(start, end).indices(n_words)
+        if start >= end:
+            return ''
+        offset = lambda i: self.starts[i] if i < len(self.starts) else tail_starts[i - len(self.starts)]
+        begin = offset(start)
+        finish = offset(end) - 1 if end < n_words else len(self.text) + len(tail_text)
+        length = len(self.text)
+        return self.text[begin:min(finish, length)] + tail_text[max(begin - length, 0):max(finish - length, 0)]
@@ -1,45 +1,49 @@
-from fastapi import FastAPI
-import uvicorn
-from models.database import Base, engine
-from routers import audio_router, tag_router, meeting_router, chat_router
-from fastapi.middleware.cors import CORSMiddleware
-import logging
-
-# Initialize FastAPI app
-app = FastAPI()
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Include audio router
-app.include_router(audio_router.router)
-
-# Include tag router
-app.include_router(tag_router.router)
-
-# Include meeting router
-app.include_router(meeting_router.router)
-
-# Include chat router
-app.include_router(chat_router.router)
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust this to restrict origins if needed
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Example route
-@app.get("/")
-def read_root():
-    return {"message": "Server is running on port 8080!"}
+import os
+import shutil
+import secrets
+import multiprocessing
+from library.config import get_config
+
+config = get_config()
+SESSION_REGISTRY = config.get('SESSION_REGISTRY', 'local')
+WORKERS = config.get('WORKERS', 1)
+
+# Set before prometheus_client is imported, the workers and the supervisor inherit it
+if SESSION_REGISTRY == 'supervisor' and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.abspath(config.get('METRICS_DIR', './metrics/'))
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+    os.environ.setdefault('SESSION_SUPERVISOR_AUTHKEY', secrets.token_hex(16))
 
 if __name__ == "__main__":
+    # Only the launcher lives here, spawned processes re-run this module as __mp_main__
+    # and shouldn't build the API on the way to their target
+    import logging
+    import uvicorn
+    from services.session_registry import serve_supervisor
+
+    supervisor = None
     try:
-        uvicorn.run(app, host="0.0.0.0", port=8080)
+        if SESSION_REGISTRY == 'supervisor':
+            # Create the tables once up front, the workers would race each other on a new database
+            from models.database import Base, engine
+            from models import models  # registers the tables on Base
+            from models.migrations import run_migrations
+            Base.metadata.create_all(bind=engine)
+            run_migrations(engine)
+            # Live meetings run in the supervisor so any worker can reach them
+            supervisor = multiprocessing.get_context('spawn').Process(target=serve_supervisor, name="session-supervisor")
+            supervisor.start()
+            uvicorn.run("app:app", host="0.0.0.0", port=8080, workers=WORKERS)
+        else:
+            if WORKERS > 1:
+                print("WORKERS > 1 needs SESSION_REGISTRY: supervisor, running a single worker")
+            from app import app
+            uvicorn.run(app, host="0.0.0.0", port=8080)
     except Exception as e:
         logging.error(f"Server crashed due to: {e}")
-        print("An error occurred while running the server. Check logs for details.")
\ No newline at end of file
+        print("An error occurred while running the server. Check logs for details.")
+    finally:
+        if supervisor:
+            supervisor.terminate()
+            supervisor.join()
\ No newline at end of file
@@ -0,0 +1,29 @@
+from sqlalchemy import text
+
+# Schema changes for existing databases. create_all only creates missing tables,
+# so anything added to an existing table goes here.
+# Each entry is applied once, tracked by PRAGMA user_version.
+MIGRATIONS = [
+    # 1: indexes for the meeting list / tag filter queries
+    [
+        "CREATE INDEX IF NOT EXISTS ix_meetings_start_time ON meetings (start_time)",
+        "CREATE INDEX IF NOT EXISTS ix_meetings_status ON meetings (status)",
+        "CREATE INDEX IF NOT EXISTS ix_meetings_tags_tag_id ON meetings_tags (tag_id)",
+    ],
+    # 2: backfill transcript_segments from the JSON transcript column, old transcripts have no timestamps
+    [
+        """INSERT OR IGNORE INTO transcript_segments (meeting_id, seq, start, "end", speaker, text)
+        SELECT m.meeting_id, j.key, NULL, NULL, json_extract(j.value, '$.speaker'), json_extract(j.value, '$.text')
+        FROM meetings m, json_each(m.transcript) j
+        WHERE m.transcript IS NOT NULL AND json_valid(m.transcript)""",
+    ],
+]
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+        for i, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(text(f"PRAGMA user_version = {i}"))
+        conn.execute(text("PRAGMA optimize"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Text, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -13,8 +13,8 @@ class Meeting(Base):
     meeting_id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     audio_id = Column(Integer, ForeignKey("audio.audio_id"))
-    status = Column(Enum(StatusEnum), nullable=False)
-    start_time = Column(String, nullable=False)
+    status = Column(Enum(StatusEnum), nullable=False, index=True)
+    start_time = Column(String, nullable=False, index=True)
     end_time = Column(String, nullable=True)
     audio_file = Column(String, nullable=True)
     summary = Column(Text, nullable=True)
@@ -22,11 +22,50 @@ class Meeting(Base):
 
     tags = relationship("Tag", secondary="meetings_tags", back_populates="meetings")
 
+class TranscriptSegment(Base):
+    __tablename__ = "transcript_segments"
+
+    meeting_id = Column(Integer, ForeignKey("meetings.meeting_id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    start = Column(Float, nullable=True)  # seconds from the start of the recording
+    end = Column(Float, nullable=True)
+    speaker = Column(String, nullable=True)
+    text = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_transcript_segments_meeting_start", "meeting_id", "start"),
+        Index("ix_transcript_segments_meeting_speaker", "meeting_id", "speaker"),
+    )
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    meeting_id = Column(Integer, ForeignKey("meetings.meeting_id"), primary_key=True)
+    summary = Column(Text, nullable=True)  # compacted messages before summarized_until
+    summarized_until = Column(Integer, nullable=False, default=0)  # seq of the first message not in the summary
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    meeting_id = Column(Integer, ForeignKey("chat_sessions.meeting_id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False)  # estimated
+
+class Speaker(Base):
+    __tablename__ = "speakers"
+
+    speaker_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    embedding = Column(LargeBinary, nullable=False)  # normalized float32 mean of the enrolled segments
+    n_segments = Column(Integer, nullable=False)
+
 class MeetingTag(Base):
     __tablename__ = "meetings_tags"
 
     meeting_id = Column(Integer, ForeignKey("meetings.meeting_id"), primary_key=True)
-    tag_id = Column(Integer, ForeignKey("tags.tag_id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.tag_id"), primary_key=True, index=True)
 
 class Tag(Base):
     __tablename__ = "tags"
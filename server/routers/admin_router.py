@@ -0,0 +1,55 @@
+import asyncio
+import secrets
+from urllib.parse import urlsplit
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import PlainTextResponse
+from services.profiler import profile, ProfilerBusy, PROFILE_MAX_SECONDS
+from services.session_registry import sessions
+from library.config import get_config
+
+config = get_config()
+
+router = APIRouter()
+
+ADMIN_TOKEN = config.get('ADMIN_TOKEN')
+LOOPBACK = ("127.0.0.1", "::1", "localhost")
+
+def is_cross_origin(request: Request):
+    # A page open in a browser on this machine connects from localhost too, and CORS lets it read the response
+    origin = request.headers.get("origin")
+    if origin and urlsplit(origin).netloc != request.headers.get("host"):
+        return True
+    return request.headers.get("sec-fetch-site", "none") not in ("same-origin", "none")
+
+def require_admin(request: Request):
+    # Without ADMIN_TOKEN only requests from this machine that don't come from a web page get in
+    if ADMIN_TOKEN:
+        token = request.headers.get("x-admin-token") or request.headers.get("authorization", "").removeprefix("Bearer ")
+        if not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Admin token required")
+    elif not request.client or request.client.host not in LOOPBACK:
+        raise HTTPException(status_code=403, detail="Admin endpoints are only served to localhost without ADMIN_TOKEN")
+    elif is_cross_origin(request):
+        raise HTTPException(status_code=403, detail="Cross-origin admin requests need ADMIN_TOKEN")
+
+@router.get("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    hz: int = Query(100, ge=1, le=1000),
+    idle: bool = Query(False, description="Include threads that are waiting"),
+    process: str = Query("api", pattern="^(api|sessions)$", description="sessions profiles the supervisor when there is one"),
+):
+    """
+    Samples every thread's stack, including the event loops and the transcription loop, for
+    seconds and returns collapsed stacks, e.g. for flamegraph.pl or speedscope.
+    """
+    run = sessions.profile if process == "sessions" else profile
+    try:
+        result = await asyncio.to_thread(run, seconds, hz, idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(result["collapsed"], headers={
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Seconds": str(result["seconds"]),
+        "X-Profile-Overhead": str(result["overhead"]),
+    })
@@ -5,27 +5,15 @@ from models.models import Audio, AudioDevices
 from schemas.audio_schema import AudioSchema, AudioDevicesSchema
 from pydantic import BaseModel
 from typing import List
-import pyaudio
+from services.device_registry import device_registry
 
 router = APIRouter()
-devices = None
 
-def get_pyaudio_devices():
+def get_pyaudio_devices(refresh: bool = False):
     """
-    :return: dict of device names to number of channels
+    :return: dict of device names to number of channels and native sample rate
     """
-    global devices
-    if devices is not None: 
-        return devices
-    audio = pyaudio.PyAudio()
-    devices = {}
-    # print("Flag")
-    for i in range(audio.get_device_count()):
-        device_info = audio.get_device_info_by_index(i)
-        if device_info['maxInputChannels'] > 0 and device_info['hostApi'] == 0:
-            devices[device_info['name']] = device_info["maxInputChannels"]
-    audio.terminate()
-    return devices
+    return device_registry.list_devices(refresh)
 
 def get_db():
     db = SessionLocal()
@@ -60,8 +48,13 @@ def delete_audio_devices_by_audio_id(audio_id: int, db: Session):
     db.query(AudioDevices).filter(AudioDevices.audio_id == audio_id).delete()
 
 @router.get("/audio-devices")
-def get_audio_devices():
-    return get_pyaudio_devices()
+def get_audio_devices(refresh: bool = False):
+    return get_pyaudio_devices(refresh)
+
+@router.post("/audio-devices/refresh")
+def refresh_audio_devices():
+    # Rescan after plugging in a device, no restart needed
+    return get_pyaudio_devices(refresh=True)
 
 @router.get("/audio", response_model=List[AudioSchema])
 def get_all_audio_with_devices(db: Session = Depends(get_db)):
@@ -82,13 +75,13 @@ def create_or_update_audio(audio: AudioSchema, db: Session = Depends(get_db)):
 
     pyaudio_devices = get_pyaudio_devices()
     for device in audio.devices:
-        n_channels = pyaudio_devices.get(device.name)
-        if not n_channels:
+        pyaudio_device = pyaudio_devices.get(device.name)
+        if not pyaudio_device:
             raise HTTPException(status_code=400, detail=f"Device with index {device.name} not found")
         db.add(AudioDevices(
             audio_id=audio_id,
             name=device.name,
-            n_channels=n_channels,
+            n_channels=pyaudio_device['n_channels'],
             channel=device.channel
         ))
     db.commit()
@@ -1,36 +1,46 @@
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import threading
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from models.database import SessionLocal
-from schemas.chat_schema import ChatRequest, ChatResponse, Classification, Category, SettingSchema, ChatCompletionsRequest
-from models.models import Setting
-from library.prompts import ClassifyPrompt, TriviaPrompt, ResumePrompt, CodingPrompt, SystemDesignPrompt, ClarifyPrompt
-import yaml
+from schemas.chat_schema import ChatRequest, ChatResponse, Category, SettingSchema, ChatCompletionsRequest, ChatMessageRequest, ChatMessageSchema, ChatSessionSchema
+from models.models import Setting, TranscriptSegment, ChatSession, ChatMessage, Meeting
+from library.prompts import TriviaPrompt, ResumePrompt, CodingPrompt, SystemDesignPrompt, ClarifyPrompt, MeetingChatPrompt, CompactPrompt
 from typing import List
-from openai import OpenAI
-import instructor
 import mss
 from PIL import Image
 import base64
 from io import BytesIO
+from library.config import get_config
+from library.metrics import CHAT_STAGE_SECONDS, SPECULATIVE_CLASSIFICATIONS, CHAT_FLIGHTS
+from library.word_index import WordIndex
+from services.session_registry import sessions
+from services.provider_scheduler import create_client, get_scheduler, INTERACTIVE, BACKGROUND, RequestCancelled
+from services.instant_providers import instant_providers
+from services.classifier import classify_conversation, SPECULATIVE_CLASSIFY
 
-# Load the configuration from config.yaml
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
+config = get_config()
 
 # Extract the API keys and models
-INSTANT_API_KEY = config['INSTANT_API_KEY']
-INSTANT_BASE_URL = config['INSTANT_BASE_URL']
-INSTANT_MODEL = config['INSTANT_MODEL']
 REASONING_API_KEY = config['REASONING_API_KEY']
 REASONING_BASE_URL = config['REASONING_BASE_URL']
 REASONING_MODEL = config['REASONING_MODEL']
 
+# Meeting chat history past this many (estimated) tokens gets compacted into a summary,
+# keeping the last CHAT_KEEP_MESSAGES messages verbatim
+CHAT_COMPACT_TOKENS = config.get('CHAT_COMPACT_TOKENS', 3000)
+CHAT_KEEP_MESSAGES = config.get('CHAT_KEEP_MESSAGES', 6)
+# A concurrent post to the same meeting chat can take the seq we computed
+SAVE_RETRIES = 5
+
 router = APIRouter()
 
-classification_client = instructor.from_openai(OpenAI(base_url = INSTANT_BASE_URL, api_key = INSTANT_API_KEY))
-instant_client = OpenAI(base_url = INSTANT_BASE_URL, api_key = INSTANT_API_KEY)
-reasoning_client = OpenAI(base_url = REASONING_BASE_URL, api_key = REASONING_API_KEY)
+# Calls go through the provider's scheduler, which queues them when the rate limit is used up.
+# The instant model goes through instant_providers, which can fail over and hedge to other providers
+reasoning_client = create_client("reasoning", REASONING_BASE_URL, REASONING_API_KEY)
 
 def get_db():
     db = SessionLocal()
@@ -39,6 +49,49 @@ def get_db():
     finally:
         db.close()
 
+# meeting_id -> (segment count, transcript length, WordIndex) of stopped meetings
+stored_word_indexes = {}
+
+def get_stored_word_index(meeting_id: int, db: Session) -> WordIndex:
+    # Segment count and length are cheap to check and change whenever the transcript is rewritten
+    n_segments, n_chars = db.query(func.count(TranscriptSegment.seq), func.coalesce(func.sum(func.length(TranscriptSegment.text)), 0)) \
+        .filter(TranscriptSegment.meeting_id == meeting_id).one()
+    cached = stored_word_indexes.get(meeting_id)
+    if cached and cached[:2] == (n_segments, n_chars):
+        return cached[2]
+
+    texts = db.query(TranscriptSegment.text).filter(TranscriptSegment.meeting_id == meeting_id).order_by(TranscriptSegment.seq).all()
+    index = WordIndex(''.join(text + '\n' for text, in texts))
+    stored_word_indexes[meeting_id] = (n_segments, n_chars, index)
+    if len(stored_word_indexes) > 32:
+        stored_word_indexes.pop(next(iter(stored_word_indexes)))
+    return index
+
+def get_conversation(request: ChatRequest, db: Session) -> str:
+    """
+    :return: the request's conversation, or the meeting's transcript from word_index to word_end
+    """
+    if request.conversation is not None:
+        return request.conversation
+    if request.meeting_id is None or request.word_index is None:
+        raise HTTPException(status_code=400, detail="Send either conversation or meeting_id and word_index")
+
+    conversation = sessions.words(request.meeting_id, request.word_index, request.word_end)
+    if conversation is None:
+        conversation = get_stored_word_index(request.meeting_id, db).slice(request.word_index, request.word_end)
+    if not conversation:
+        raise HTTPException(status_code=400, detail="No transcript at word_index")
+    return conversation
+
+def get_question_type(request: ChatRequest, conversation: str, cancel: threading.Event) -> str:
+    # A click on a recent live word usually lands in an utterance that was already classified in the background
+    if request.conversation is None and SPECULATIVE_CLASSIFY:
+        question_type = sessions.classification(request.meeting_id, request.word_index, request.word_end)
+        SPECULATIVE_CLASSIFICATIONS.labels("hit" if question_type else "miss").inc()
+        if question_type:
+            return question_type
+    return classify_conversation(conversation, cancel=cancel)
+
 def get_encoded_screenshot(monitor_number):
     with mss.mss() as sct:
         screenshot = sct.grab(sct.monitors[monitor_number])  # Change index if needed
@@ -52,15 +105,6 @@ def get_encoded_screenshot(monitor_number):
         # Encode as base64
         return base64.b64encode(buffer.read()).decode('utf-8')
 
-def classify_conversation(conversation):
-    prompt = ClassifyPrompt(conversation)
-    completion = classification_client.chat.completions.create(
-        model = INSTANT_MODEL,
-        messages=prompt.get_messages(),
-        response_model=Classification,
-    )
-    return completion.category.value
-
 def get_settings_map(db: Session):
     settings = db.query(Setting).all()
     return {setting.key: setting.value for setting in settings}
@@ -82,41 +126,123 @@ def save_setting(request: SettingSchema, db: Session = Depends(get_db)):
     db.refresh(existing_setting or setting)
     return existing_setting or setting
 
+class ChatFlight:
+    """
+    One /chat computation, shared by identical requests that arrive while it runs
+    """
+    def __init__(self, key, meeting_id):
+        self.key = key
+        self.meeting_id = meeting_id
+        self.cancel = threading.Event()
+        self.superseded = False
+        self.waiters = 0
+        self.task = None
+
+# In-flight /chat requests by request key, and the latest one per meeting. Only touched on the event loop
+chat_flights = {}
+meeting_flights = {}
+
+def chat_key(request: ChatRequest):
+    return (request.conversation, request.meeting_id, request.word_index, request.word_end,
+            request.question_type, request.use_image, request.use_reasoning)
+
+def start_chat_flight(request: ChatRequest) -> ChatFlight:
+    flight = ChatFlight(chat_key(request), request.meeting_id)
+    flight.task = asyncio.create_task(asyncio.to_thread(run_chat, request.model_copy(), flight.cancel))
+    chat_flights[flight.key] = flight
+
+    # A newer click on the same meeting replaces the older request, stop paying for it
+    if flight.meeting_id is not None:
+        previous = meeting_flights.get(flight.meeting_id)
+        if previous and not previous.task.done():
+            previous.superseded = True
+            previous.cancel.set()
+            CHAT_FLIGHTS.labels("superseded").inc()
+        meeting_flights[flight.meeting_id] = flight
+
+    def finished(task):
+        if chat_flights.get(flight.key) is flight:
+            del chat_flights[flight.key]
+        if meeting_flights.get(flight.meeting_id) is flight:
+            del meeting_flights[flight.meeting_id]
+    flight.task.add_done_callback(finished)
+    return flight
+
 @router.post("/chat", response_model=ChatResponse)
-def getChatResponse(request: ChatRequest, db: Session = Depends(get_db)) -> ChatResponse:
+async def getChatResponse(request: ChatRequest, http_request: Request) -> ChatResponse:
+    """
+    Identical requests in flight share one provider call, a newer request for the same meeting
+    cancels the older one (409), and the call is cancelled when every client waiting on it disconnects
+    """
+    flight = chat_flights.get(chat_key(request))
+    if flight and not flight.cancel.is_set():
+        CHAT_FLIGHTS.labels("coalesced").inc()
+    else:
+        flight = start_chat_flight(request)
+
+    flight.waiters += 1
+    try:
+        while True:
+            # asyncio.wait doesn't cancel the task, the other waiters may still want it
+            done, _ = await asyncio.wait({flight.task}, timeout=.5)
+            if done:
+                break
+            if await http_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client closed request")
+        try:
+            return flight.task.result()
+        except RequestCancelled:
+            raise HTTPException(status_code=409, detail="Superseded by a newer request" if flight.superseded else "Cancelled")
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.cancel.set()
+            CHAT_FLIGHTS.labels("disconnected").inc()
+
+def run_chat(request: ChatRequest, cancel: threading.Event) -> ChatResponse:
+    """
+    Blocking part of /chat, runs on a worker thread and stops at the next provider call or stream chunk once cancel is set
+    """
+    db = SessionLocal()
+    try:
+        return generate_chat_response(request, db, cancel)
+    finally:
+        db.close()
+
+def generate_chat_response(request: ChatRequest, db: Session, cancel: threading.Event) -> ChatResponse:
+    with CHAT_STAGE_SECONDS.labels("chat", "transcript").time():
+        conversation = get_conversation(request, db)
+
     # Classify the request if question_type is null
     if request.question_type is None:  
-        request.question_type = classify_conversation(request.conversation)
-
-    # What model to use
-    client = instant_client
-    model = INSTANT_MODEL
-    if request.use_reasoning:
-        client = reasoning_client
-        model = REASONING_MODEL
+        with CHAT_STAGE_SECONDS.labels("chat", "classify").time():
+            request.question_type = get_question_type(request, conversation, cancel)
 
     # Get resume, job_description, and monitor # from settings if requested
-    settings = get_settings_map(db)
+    with CHAT_STAGE_SECONDS.labels("chat", "settings").time():
+        settings = get_settings_map(db)
     resume = settings.get('resume', "")
     job_description = settings.get('job_description', "")
     monitor_number = int(settings.get('monitor_number', "1"))
 
     # Create the appropriate prompt based on the question type
     if request.question_type == "trivia":
-        prompt_object = TriviaPrompt(request.conversation, resume)
+        prompt_object = TriviaPrompt(conversation, resume)
     elif request.question_type == "resume":
-        prompt_object = ResumePrompt(request.conversation, resume)
+        prompt_object = ResumePrompt(conversation, resume)
     elif request.question_type == "coding":
-        prompt_object = CodingPrompt(request.conversation)
+        prompt_object = CodingPrompt(conversation)
     elif request.question_type == "system_design":
-        prompt_object = SystemDesignPrompt(request.conversation)
+        prompt_object = SystemDesignPrompt(conversation)
     elif request.question_type == "clarify":
-        prompt_object = ClarifyPrompt(request.conversation)
+        prompt_object = ClarifyPrompt(conversation)
     else:
         raise HTTPException(status_code=400, detail="Invalid question type")
 
     messages = prompt_object.get_messages()    
     if request.use_image:
+        with CHAT_STAGE_SECONDS.labels("chat", "screenshot").time():
+            encoded_screenshot = get_encoded_screenshot(monitor_number)
         messages=[
             {"role": "system", "content": prompt_object.system_prompt},
             {
@@ -126,21 +252,27 @@ def getChatResponse(request: ChatRequest, db: Session = Depends(get_db)) -> Chat
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{get_encoded_screenshot(monitor_number)}",
+                            "url": f"data:image/jpeg;base64,{encoded_screenshot}",
                         },
                     },
                 ]
             }
         ]
 
-    # Send to client
-    response = client.chat.completions.create(
-        model=model,
-        stream=False,
-        messages=messages,
-    )
-
-    response_message = response.choices[0].message.content if response.choices else ""
+    # Send to the reasoning model if requested, otherwise the instant one
+    with CHAT_STAGE_SECONDS.labels("chat", "generation").time():
+        if request.use_reasoning:
+            # Only cancellable while queued, the reasoning answer isn't streamed
+            response = get_scheduler("reasoning").call(
+                INTERACTIVE, "chat", reasoning_client.chat.completions.create,
+                cancelled=cancel,
+                model=REASONING_MODEL,
+                stream=False,
+                messages=messages,
+            )
+            response_message = response.choices[0].message.content if response.choices else ""
+        else:
+            response_message = instant_providers.complete(INTERACTIVE, "chat", messages, cancel=cancel)
 
     # Send response message back
     return ChatResponse(response=response_message, question_type = request.question_type)
@@ -148,13 +280,120 @@ def getChatResponse(request: ChatRequest, db: Session = Depends(get_db)) -> Chat
 
 @router.post("/chat/completions", response_model=str)
 def getChatCompletions(request: ChatCompletionsRequest, db: Session = Depends(get_db)) -> str:
-    # Pass the messages to the instant_client
-    response = instant_client.chat.completions.create(
-        model=INSTANT_MODEL,
-        stream=False,
-        messages=request.messages,
+    # Pass the messages to the instant model, as the plain dicts the client and the scheduler expect
+    messages = [message.model_dump() for message in request.messages]
+    with CHAT_STAGE_SECONDS.labels("chat_completions", "generation").time():
+        return instant_providers.complete(INTERACTIVE, "chat_completions", messages)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token, only used to decide when to compact
+    return len(text) // 4 + 1
+
+def get_transcript_text(meeting_id: int, db: Session) -> str:
+    live = sessions.transcription(meeting_id)
+    return live if live is not None else get_stored_word_index(meeting_id, db).text
+
+def get_chat_session(meeting_id: int, db: Session) -> ChatSession:
+    # Not added to the session, the row is only written with the first messages
+    return db.get(ChatSession, meeting_id) or ChatSession(meeting_id=meeting_id, summarized_until=0)
+
+def save_chat_turn(meeting_id: int, user_content: str, bot_content: str, db: Session):
+    """
+    Appends a user message and its response after the last stored message, creating the chat
+    session if needed. A concurrent post can take the same seq first, then this reads it again.
+    :return: (user message, bot message)
+    """
+    for attempt in range(SAVE_RETRIES):
+        if not db.get(ChatSession, meeting_id):
+            db.add(ChatSession(meeting_id=meeting_id, summarized_until=0))
+        last = db.query(func.max(ChatMessage.seq)).filter(ChatMessage.meeting_id == meeting_id).scalar()
+        seq = last + 1 if last is not None else 0
+        user_message = ChatMessage(meeting_id=meeting_id, seq=seq, role="user", content=user_content, tokens=estimate_tokens(user_content))
+        bot_message = ChatMessage(meeting_id=meeting_id, seq=seq + 1, role="assistant", content=bot_content, tokens=estimate_tokens(bot_content))
+        db.add_all([user_message, bot_message])
+        try:
+            db.commit()
+            return user_message, bot_message
+        except IntegrityError:
+            db.rollback()
+            if attempt == SAVE_RETRIES - 1:
+                raise
+
+def get_chat_messages(meeting_id: int, db: Session, since: int = 0) -> List[ChatMessage]:
+    return db.query(ChatMessage).filter(ChatMessage.meeting_id == meeting_id, ChatMessage.seq >= since) \
+        .order_by(ChatMessage.seq).all()
+
+def compact_chat(meeting_id: int):
+    """
+    Folds all but the last CHAT_KEEP_MESSAGES messages into the session summary.
+    Runs after the response is sent, so the turn that crosses the threshold doesn't wait for it.
+    """
+    db = SessionLocal()
+    try:
+        chat_session = db.get(ChatSession, meeting_id)
+        messages = get_chat_messages(meeting_id, db, chat_session.summarized_until)
+        old = messages[:-CHAT_KEEP_MESSAGES]
+        if not old or sum(message.tokens for message in messages) <= CHAT_COMPACT_TOKENS:
+            return
+
+        prompt = CompactPrompt(chat_session.summary, [{"role": message.role, "content": message.content} for message in old])
+        summary = instant_providers.complete(BACKGROUND, "compact", prompt.get_messages())
+
+        # Another worker may have compacted in the meantime, only apply on top of what we read
+        db.query(ChatSession).filter(
+            ChatSession.meeting_id == meeting_id,
+            ChatSession.summarized_until == chat_session.summarized_until,
+        ).update({"summary": summary, "summarized_until": old[-1].seq + 1})
+        db.commit()
+    except Exception as e:
+        print(f"Failed to compact chat for meeting {meeting_id}: {e}")
+    finally:
+        db.close()
+
+@router.get("/meetings/{meeting_id}/chat", response_model=ChatSessionSchema)
+def get_meeting_chat(meeting_id: int, db: Session = Depends(get_db)):
+    """
+    Full history for display, compacted messages included
+    """
+    chat_session = db.get(ChatSession, meeting_id)
+    messages = get_chat_messages(meeting_id, db) if chat_session else []
+    return ChatSessionSchema(
+        meeting_id=meeting_id,
+        summary=chat_session.summary if chat_session else None,
+        messages=[ChatMessageSchema(seq=message.seq, role=message.role, content=message.content) for message in messages],
     )
 
-    # Return the response message
-    response_message = response.choices[0].message.content if response.choices else ""
-    return response_message
\ No newline at end of file
+@router.post("/meetings/{meeting_id}/chat", response_model=ChatMessageSchema)
+def post_meeting_chat(meeting_id: int, request: ChatMessageRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Takes only the new user message, the history is kept here. The prompt is the transcript,
+    the summary of compacted messages and the messages since.
+    """
+    if not db.get(Meeting, meeting_id):
+        raise HTTPException(status_code=404, detail="Meeting not found")
+    with CHAT_STAGE_SECONDS.labels("meeting_chat", "history").time():
+        transcript = get_transcript_text(meeting_id, db)
+        chat_session = get_chat_session(meeting_id, db)
+        history = get_chat_messages(meeting_id, db, chat_session.summarized_until)
+    messages = MeetingChatPrompt(transcript, chat_session.summary).get_messages()
+    messages += [{"role": message.role, "content": message.content} for message in history]
+    messages.append({"role": "user", "content": request.content})
+    history_tokens = sum(message.tokens for message in history)
+    # Nothing is written until the response is in, don't hold a transaction open during the call
+    db.rollback()
+
+    with CHAT_STAGE_SECONDS.labels("meeting_chat", "generation").time():
+        response_message = instant_providers.complete(INTERACTIVE, "meeting_chat", messages)
+
+    user_message, bot_message = save_chat_turn(meeting_id, request.content, response_message, db)
+
+    if history_tokens + user_message.tokens + bot_message.tokens > CHAT_COMPACT_TOKENS:
+        background_tasks.add_task(compact_chat, meeting_id)
+    return ChatMessageSchema(seq=bot_message.seq, role=bot_message.role, content=bot_message.content)
+
+@router.delete("/meetings/{meeting_id}/chat", response_model=dict)
+def delete_meeting_chat(meeting_id: int, db: Session = Depends(get_db)):
+    db.query(ChatMessage).filter(ChatMessage.meeting_id == meeting_id).delete()
+    db.query(ChatSession).filter(ChatSession.meeting_id == meeting_id).delete()
+    db.commit()
+    return {"message": "Chat history deleted"}
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.model_registry import registry
+from services.session_registry import sessions
+from library.config import get_config
+
+config = get_config()
+
+router = APIRouter()
+
+@router.get("/health/ready")
+def get_readiness():
+    """
+    Per-model load state and load time. 503 until every model in WARMUP_MODELS is loaded,
+    requests that don't need ASR are served before that.
+    """
+    models = registry.status()
+    # ASR models load where the sessions run, in the supervisor when there is one
+    models.update({name: state for name, state in sessions.model_status().items() if name.startswith('asr')})
+    ready = all(models.get(name, {}).get('state') == 'ready' for name in config.get('WARMUP_MODELS', ['asr']))
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "models": models})
@@ -1,41 +1,26 @@
 import os, time, asyncio, json
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, Query
 from sqlalchemy.orm import Session
-from models.database import SessionLocal
-from models.models import Meeting, MeetingTag, Tag
-from schemas.meeting_schema import MeetingStart, MeetingBase, MeetingTags, UpdateTitleRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import SessionLocal, AsyncSessionLocal
+from models.models import Meeting, MeetingTag, Tag, TranscriptSegment, ChatSession, ChatMessage, StatusEnum
+from schemas.meeting_schema import MeetingStart, MeetingReplay, MeetingBase, MeetingTags, UpdateTitleRequest, TranscriptSegmentSchema
 from schemas.tag_schema import TagSchema
-from typing import List
+from typing import List, Optional
 from routers.audio_router import get_audio_devices_by_audio_id
-from services.audio_service import AudioService
 from services.post_processing import diarize, summarize
+from services.speakers import get_enrolled
+from services.transcript_journal import read_journal, journal_age, remove_journal
+from services.model_registry import registry, asr_registry_name
+from services.session_registry import sessions
 from pydantic import BaseModel
-import torch
-import whisper
-from pyannote.audio import Pipeline
+from library.config import get_config
+from library.responses import FastJSONResponse
 
-import yaml
-# Load the configuration from config.yaml
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
+config = get_config()
 
 router = APIRouter()
 
-# meeting_id -> AudioService
-services = {}  
-
-if torch.backends.cuda.is_built():
-    device = "cuda"
-else:
-    device = "cpu"
-
-# whisper_model = whisper.load_model("base.en", device=device)
-whisper_model = whisper.load_model("turbo", device=device)
-HUGGINGFACE_TOKEN = config.get("HUGGINGFACE_TOKEN", "") 
-
-diarization_pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=HUGGINGFACE_TOKEN)
-diarization_pipeline.to(torch.device(device))
-
 def get_db():
     db = SessionLocal()
     try:
@@ -43,6 +28,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def get_current_time() -> str:
     return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())
 
@@ -52,24 +41,47 @@ def get_meeting_by_id(meeting_id: int, db: Session) -> Meeting:
         raise HTTPException(status_code=404, detail="Meeting not found")
     return meeting
 
-def get_tags_for_meeting(meeting_id: int, db: Session) -> List[TagSchema]:
-    tags = db.query(Tag).join(MeetingTag).filter(MeetingTag.meeting_id == meeting_id).all()
-    return [TagSchema(tag_id=tag.tag_id, name=tag.name) for tag in tags]
-
-def create_meeting_tags_response(meeting: Meeting, db: Session) -> MeetingTags:
-    tags = get_tags_for_meeting(meeting.meeting_id, db)
-    return MeetingTags(
-        meeting_id=meeting.meeting_id,
-        title=meeting.title,
-        audio_id=meeting.audio_id,
-        status=meeting.status,
-        start_time=meeting.start_time,
-        end_time=meeting.end_time,
-        audio_file=meeting.audio_file,
-        transcript=meeting.transcript,
-        summary=meeting.summary,
-        tags=tags
-    )
+# Everything the meeting views send except the transcript, selected as plain rows
+MEETING_COLUMNS = (Meeting.meeting_id, Meeting.title, Meeting.audio_id, Meeting.status,
+                   Meeting.start_time, Meeting.end_time, Meeting.audio_file, Meeting.summary)
+# SQLite's default limit on bound parameters is 999
+TAG_BATCH_SIZE = 500
+
+def get_tags_for_meetings(meeting_ids: List[int], db: Session) -> dict:
+    """
+    :return: dict of meeting_id to its tags as dicts, one query per TAG_BATCH_SIZE meetings
+    """
+    tags = {meeting_id: [] for meeting_id in meeting_ids}
+    for i in range(0, len(meeting_ids), TAG_BATCH_SIZE):
+        rows = db.query(MeetingTag.meeting_id, Tag.tag_id, Tag.name).join(Tag, Tag.tag_id == MeetingTag.tag_id) \
+            .filter(MeetingTag.meeting_id.in_(meeting_ids[i:i + TAG_BATCH_SIZE]))
+        for meeting_id, tag_id, name in rows:
+            tags[meeting_id].append({"tag_id": tag_id, "name": name})
+    return tags
+
+def meeting_to_dict(meeting, tags, include_transcript: bool = False) -> dict:
+    """
+    MeetingTags as a plain dict, from a Meeting or a row of MEETING_COLUMNS (plus transcript if included)
+    """
+    status = meeting.status
+    return {
+        "audio_id": meeting.audio_id,
+        "asr_tier": None,
+        "meeting_id": meeting.meeting_id,
+        "title": meeting.title,
+        "status": status.value if isinstance(status, StatusEnum) else status,
+        "start_time": meeting.start_time,
+        "end_time": meeting.end_time,
+        "audio_file": meeting.audio_file,
+        "transcript": meeting.transcript if include_transcript else None,
+        "summary": meeting.summary,
+        "tags": tags,
+    }
+
+def create_meeting_tags_response(meeting: Meeting, db: Session, include_transcript: bool = False) -> dict:
+    # The full transcript is only sent on request, use /meetings/{meeting_id}/segments to page through it
+    tags = get_tags_for_meetings([meeting.meeting_id], db)[meeting.meeting_id]
+    return meeting_to_dict(meeting, tags, include_transcript)
 
 def get_or_create_tag(tag_name: str, db: Session) -> Tag:
     tag = db.query(Tag).filter(Tag.name == tag_name).first()
@@ -90,8 +102,77 @@ def add_meeting_tag_relationship(meeting_id: int, tag_id: int, db: Session):
         db.add(meeting_tag)
         db.commit()
 
+def save_segments(meeting_id: int, segments, db: Session):
+    """
+    Replaces the meeting's transcript_segments rows, segments are dicts with seq, start, end, speaker, text
+    """
+    db.query(TranscriptSegment).filter(TranscriptSegment.meeting_id == meeting_id).delete()
+    db.add_all([
+        TranscriptSegment(
+            meeting_id=meeting_id,
+            seq=segment.get('seq', seq),
+            start=segment.get('start'),
+            end=segment.get('end'),
+            speaker=segment.get('speaker'),
+            text=segment['text'],
+        ) for seq, segment in enumerate(segments)
+    ])
+
+def finalize_meeting(meeting: Meeting, segments):
+    meeting.transcript = json.dumps([{'speaker': 'Unknown', 'text': ''.join(segment['text'] + '\n' for segment in segments)}])
+    meeting.status = "COMPLETED"
+    meeting.audio_file = os.path.join(config.get('OUTPUT_DIR', './recordings/'), f"{meeting.meeting_id}.wav")
+    meeting.end_time = get_current_time()
+
+async def start_audio_service(meeting_id: int, audio_device_info, segments=None, asr_tier=None, replay=None):
+    # Models load lazily, the first meeting waits for warmup to finish
+    await asyncio.to_thread(sessions.start, meeting_id, audio_device_info, segments, asr_tier, replay)
+
+def resume_meeting(meeting: Meeting, segments, db: Session):
+    # The new recording would overwrite the old wav, keep the old one next to it
+    audio_file = os.path.join(config.get('OUTPUT_DIR', './recordings/'), f"{meeting.meeting_id}.wav")
+    if os.path.exists(audio_file):
+        os.replace(audio_file, audio_file.replace('.wav', f"-{int(time.time())}.wav"))
+
+    audio_device_info = get_audio_devices_by_audio_id(meeting.audio_id, db)
+    # Don't hold up startup waiting for the ASR model
+    asyncio.create_task(start_audio_service(meeting.meeting_id, audio_device_info, segments))
+
+async def recover_meetings():
+    """
+    Run on startup. Meetings still ACTIVE lost their AudioService when the server went down.
+    Meetings whose journal was written within RESUME_WINDOW_SECONDS are resumed with their
+    journaled transcript, the rest are orphaned and get finalized from the journal.
+    With several API workers only the first one to start does this.
+    """
+    if not await asyncio.to_thread(sessions.claim_recovery):
+        return
+    resume_window = config.get('RESUME_WINDOW_SECONDS', 300)
+    db = SessionLocal()
+    try:
+        for meeting in db.query(Meeting).filter(Meeting.status == "ACTIVE").all():
+            segments = read_journal(meeting.meeting_id)
+            age = journal_age(meeting.meeting_id)
+            # Replayed meetings have no devices to resume
+            if meeting.audio_id is not None and age is not None and age < resume_window:
+                print(f"Resuming meeting {meeting.meeting_id} with {len(segments)} journaled segments")
+                resume_meeting(meeting, segments, db)
+            else:
+                print(f"Finalizing orphaned meeting {meeting.meeting_id}")
+                finalize_meeting(meeting, segments)
+                save_segments(meeting.meeting_id, segments, db)
+                db.commit()
+                remove_journal(meeting.meeting_id)
+    finally:
+        db.close()
+
 @router.post("/meetings/start", response_model=MeetingBase)
-async def start_meeting(meeting: MeetingStart, db: Session = Depends(get_db)):
+async def start_meeting(meeting: MeetingStart, db: AsyncSession = Depends(get_async_db)):
+    try:
+        asr_registry_name(meeting.asr_tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     new_meeting = Meeting(
         title="Untitled Meeting",
         audio_id=meeting.audio_id,
@@ -99,46 +180,110 @@ async def start_meeting(meeting: MeetingStart, db: Session = Depends(get_db)):
         start_time=get_current_time(),
     )
     db.add(new_meeting)
-    db.commit()
-    db.refresh(new_meeting)
+    await db.commit()
+    await db.refresh(new_meeting)
 
     # Start the audio service for this meeting
-    audio_device_info = get_audio_devices_by_audio_id(meeting.audio_id, db)
-    service = AudioService(audio_device_info, whisper_model, new_meeting.meeting_id)
-    services[new_meeting.meeting_id] = service
-    asyncio.create_task(service.start())
+    try:
+        audio_device_info = await db.run_sync(lambda session: get_audio_devices_by_audio_id(meeting.audio_id, session))
+        await start_audio_service(new_meeting.meeting_id, audio_device_info, asr_tier=meeting.asr_tier)
+    except Exception:
+        # Don't leave an ACTIVE meeting behind for the next startup to "recover"
+        await db.delete(new_meeting)
+        await db.commit()
+        raise
 
     return new_meeting
 
+@router.post("/meetings/replay", response_model=List[MeetingBase])
+async def replay_meeting(replay: MeetingReplay, db: AsyncSession = Depends(get_async_db)):
+    """
+    Starts meetings fed from an audio file instead of live devices, for reproducing
+    a meeting or load testing transcription on machines without sound hardware
+    """
+    try:
+        asr_registry_name(replay.asr_tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    replay_dir = os.path.realpath(config.get('REPLAY_DIRECTORY', './replays/'))
+    path = os.path.realpath(os.path.join(replay_dir, replay.audio_file))
+    if not path.startswith(replay_dir + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Replay file not found")
+    if replay.copies < 1 or replay.speed < 0:
+        raise HTTPException(status_code=400, detail="copies must be at least 1 and speed can't be negative")
+
+    meetings = []
+    for _ in range(replay.copies):
+        new_meeting = Meeting(
+            title=f"Replay of {replay.audio_file}",
+            status="ACTIVE",
+            start_time=get_current_time(),
+        )
+        db.add(new_meeting)
+        meetings.append(new_meeting)
+    await db.commit()
+
+    for i, new_meeting in enumerate(meetings):
+        await db.refresh(new_meeting)
+        try:
+            await start_audio_service(new_meeting.meeting_id, [], asr_tier=replay.asr_tier,
+                                      replay={"path": path, "speed": replay.speed, "loop": replay.loop})
+        except Exception:
+            # The copies that didn't start would stay ACTIVE
+            for failed in meetings[i:]:
+                await db.delete(failed)
+            await db.commit()
+            raise
+
+    return meetings
+
 @router.websocket("/meetings/{meeting_id}")
-async def meeting_websocket(websocket: WebSocket, meeting_id: int):
+async def meeting_websocket(websocket: WebSocket, meeting_id: int, format: str = 'text'):
+    # format=json sends {"transcript", "status"} so clients can show when transcription falls behind
     await websocket.accept()
-    service = services.get(meeting_id)
-    if not service:
+    if not await asyncio.to_thread(sessions.is_active, meeting_id):
         await websocket.send_text("No audio service running for this meeting.")
         await websocket.close()
         return
 
     try:
         while True:
-            transcription = service.get_transcription()
-            await websocket.send_text(transcription)
+            # The session may live in the supervisor process, don't block the loop on the round trip
+            if format == 'json':
+                state = await asyncio.to_thread(sessions.live_state, meeting_id)
+                if state is None:
+                    break
+                await websocket.send_json(state)
+            else:
+                transcription = await asyncio.to_thread(sessions.transcription, meeting_id)
+                if transcription is None:
+                    break
+                await websocket.send_text(transcription)
             await asyncio.sleep(1)  # Send updates every second
     except Exception as e:
         print(f"Error in WebSocket connection: {e}")
     finally:
         print("Closing WebSocket connection")
 
+@router.get("/meetings/{meeting_id}/stats", response_model=dict)
+def get_meeting_stats(meeting_id: int):
+    capture = sessions.capture_stats(meeting_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="No audio service running for this meeting")
+    return {"capture": capture, "transcription": sessions.transcription_status(meeting_id)}
+
 @router.post("/meetings/{meeting_id}/stop", response_model=MeetingTags)
-async def stop_meeting(meeting_id: int, db: Session = Depends(get_db)):
+async def stop_meeting(meeting_id: int, db: AsyncSession = Depends(get_async_db)):
     # Stop the audio service and print the transcription
-    meeting = get_meeting_by_id(meeting_id, db)
-    service = services.pop(meeting_id, None)
+    meeting = await db.run_sync(lambda session: get_meeting_by_id(meeting_id, session))
+    # Joins the capture threads, keep it off the event loop
+    stopped = await asyncio.to_thread(sessions.stop, meeting_id)
     transcript = ""
-    if service:
-        transcript = service.get_transcription()
+    if stopped:
+        print(f"Capture stats for meeting {meeting_id}: {stopped['capture']}")
+        transcript = stopped['transcript']
         meeting.transcript = json.dumps([{'speaker': 'Unknown', 'text': transcript}])
-        service.stop()
+        await db.run_sync(lambda session: save_segments(meeting_id, stopped['segments'], session))
     else:
         print("No audio service running for this meeting.")
 
@@ -147,10 +292,10 @@ async def stop_meeting(meeting_id: int, db: Session = Depends(get_db)):
     meeting.audio_file = audio_file
     meeting.end_time = get_current_time()
 
-    db.commit()  # Commit status before async services
+    await db.commit()  # Commit status before async services
 
     # Kick off the diarization_service and summarization_service
-    # diarization_task = asyncio.create_task(diarize(audio_file, whisper_model, diarization_pipeline))
+    # diarization_task = asyncio.create_task(diarize(audio_file, asr_backend, diarization_pipeline))
     # summarization_task = asyncio.create_task(summarize(transcript))
 
     # Wait for both services to complete
@@ -160,47 +305,131 @@ async def stop_meeting(meeting_id: int, db: Session = Depends(get_db)):
     # meeting.transcript = json.dumps(diarized_transcript)
     # meeting.summary = finished_summary
 
-    db.commit()  # Commit status after async services
+    await db.commit()  # Commit status after async services
 
-    db.refresh(meeting)
+    await db.refresh(meeting)
+    remove_journal(meeting_id)
 
-    return create_meeting_tags_response(meeting, db)
+    return await db.run_sync(lambda session: create_meeting_tags_response(meeting, session))
 
 @router.delete("/meetings/{meeting_id}", response_model=dict)
 def delete_meeting(meeting_id: int, db: Session = Depends(get_db)):
     # Stop the audio service if it's running
-    service = services.pop(meeting_id, None)
-    if service:
-        service.stop()
+    sessions.stop(meeting_id)
 
     db.query(MeetingTag).filter(MeetingTag.meeting_id == meeting_id).delete()
+    db.query(TranscriptSegment).filter(TranscriptSegment.meeting_id == meeting_id).delete()
+    db.query(ChatMessage).filter(ChatMessage.meeting_id == meeting_id).delete()
+    db.query(ChatSession).filter(ChatSession.meeting_id == meeting_id).delete()
     meeting = db.query(Meeting).filter(Meeting.meeting_id == meeting_id).first()
     if not meeting:
         raise HTTPException(status_code=404, detail="Meeting not found")
 
     db.delete(meeting)
     db.commit()
+    remove_journal(meeting_id)
     return {"message": "Meeting and associated tags deleted successfully"}
 
 # TODO Add offset if meetings > 100
-@router.get("/meetings", response_model=List[MeetingTags])
+# The GET views skip response_model validation, rows go straight to dicts and through orjson
+@router.get("/meetings", response_model=List[MeetingTags], response_class=FastJSONResponse)
 def get_all_meetings(
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
-    tags: List[str] = Query(None)
+    tags: List[str] = Query(None),
+    include_transcript: bool = Query(False)
 ):
     # offset = (page - 1) * 10
-    query = db.query(Meeting).order_by(Meeting.start_time.desc())
+    columns = MEETING_COLUMNS + (Meeting.transcript,) if include_transcript else MEETING_COLUMNS
+    query = db.query(*columns).order_by(Meeting.start_time.desc())
     if tags:
-        query = query.join(MeetingTag).join(Tag).filter(Tag.name.in_(tags)).distinct()
+        query = query.join(MeetingTag, MeetingTag.meeting_id == Meeting.meeting_id).join(Tag).filter(Tag.name.in_(tags)).distinct()
     meetings = query.all()
     # meetings = query.offset(offset).limit(10).all()
-    return [create_meeting_tags_response(meeting, db) for meeting in meetings]
+    meeting_tags = get_tags_for_meetings([meeting.meeting_id for meeting in meetings], db)
+    return FastJSONResponse([meeting_to_dict(meeting, meeting_tags[meeting.meeting_id], include_transcript) for meeting in meetings])
 
-@router.get("/meetings/{meeting_id}", response_model=MeetingTags)
-def get_meeting(meeting_id: int, db: Session = Depends(get_db)):
-    meeting = get_meeting_by_id(meeting_id, db)
-    return create_meeting_tags_response(meeting, db)
+@router.get("/meetings/{meeting_id}", response_model=MeetingTags, response_class=FastJSONResponse)
+def get_meeting(meeting_id: int, include_transcript: bool = Query(False), db: Session = Depends(get_db)):
+    columns = MEETING_COLUMNS + (Meeting.transcript,) if include_transcript else MEETING_COLUMNS
+    meeting = db.query(*columns).filter(Meeting.meeting_id == meeting_id).first()
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Meeting not found")
+    return FastJSONResponse(create_meeting_tags_response(meeting, db, include_transcript))
+
+@router.get("/meetings/{meeting_id}/segments", response_model=List[TranscriptSegmentSchema])
+def get_meeting_segments(
+    meeting_id: int,
+    start: Optional[float] = Query(None, description="Start of the time window in seconds"),
+    end: Optional[float] = Query(None, description="End of the time window in seconds"),
+    seq_start: Optional[int] = Query(None, ge=0),
+    seq_end: Optional[int] = Query(None, ge=0, description="Exclusive"),
+    speaker: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    # Live meetings are served from the AudioService, rows are written when the meeting stops
+    live = sessions.segments(meeting_id, start, end, seq_start, seq_end, speaker, limit)
+    if live is not None:
+        return live
+    # Without loading the transcript
+    if not db.query(Meeting.meeting_id).filter(Meeting.meeting_id == meeting_id).first():
+        raise HTTPException(status_code=404, detail="Meeting not found")
+
+    query = db.query(TranscriptSegment).filter(TranscriptSegment.meeting_id == meeting_id)
+    if start is not None:
+        query = query.filter(TranscriptSegment.end >= start)
+    if end is not None:
+        query = query.filter(TranscriptSegment.start <= end)
+    if seq_start is not None:
+        query = query.filter(TranscriptSegment.seq >= seq_start)
+    if seq_end is not None:
+        query = query.filter(TranscriptSegment.seq < seq_end)
+    if speaker is not None:
+        query = query.filter(TranscriptSegment.speaker == speaker)
+    return query.order_by(TranscriptSegment.seq).limit(limit).all()
+
+@router.post("/meetings/{meeting_id}/diarize", response_model=List[TranscriptSegmentSchema])
+async def diarize_meeting(meeting_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Re-transcribes the recording with speaker labels and replaces the meeting's segments
+    """
+    meeting = await db.run_sync(lambda session: get_meeting_by_id(meeting_id, session))
+    if meeting.status != StatusEnum.COMPLETED or not meeting.audio_file:
+        raise HTTPException(status_code=400, detail="Meeting has no finished recording")
+
+    asr_backend = await asyncio.to_thread(registry.get, "asr")
+    # Enrolled speakers are matched by embedding, the full pipeline only loads if segments are left over
+    enrolled = await db.run_sync(get_enrolled)
+    embedding_model = await asyncio.to_thread(registry.get, "speaker_embedding") if enrolled[0] else None
+    diarized = await diarize(meeting.audio_file, asr_backend, lambda: registry.get("diarization"), embedding_model, enrolled)
+    segments = [dict(segment, seq=seq) for seq, segment in enumerate(diarized)]
+    meeting.transcript = json.dumps(diarized)
+    await db.run_sync(lambda session: save_segments(meeting_id, segments, session))
+    await db.commit()
+    return segments
+
+@router.post("/meetings/{meeting_id}/summarize", response_model=MeetingTags)
+async def summarize_meeting(meeting_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Summarizes the meeting's transcript and saves it as the meeting summary
+    """
+    def load(session):
+        meeting = get_meeting_by_id(meeting_id, session)
+        texts = session.query(TranscriptSegment.text).filter(TranscriptSegment.meeting_id == meeting_id) \
+            .order_by(TranscriptSegment.seq).all()
+        return meeting, ' '.join(text for text, in texts)
+
+    meeting, transcript = await db.run_sync(load)
+    live = await asyncio.to_thread(sessions.transcription, meeting_id)
+    if live is not None:
+        transcript = live
+    if not transcript.strip():
+        raise HTTPException(status_code=400, detail="Meeting has no transcript")
+
+    meeting.summary = await summarize(transcript)
+    await db.commit()
+    return await db.run_sync(lambda session: create_meeting_tags_response(meeting, session))
 
 @router.post("/meetings/{meeting_id}", response_model=MeetingTags)
 def update_meeting_title(meeting_id: int, request: UpdateTitleRequest, db: Session = Depends(get_db)):
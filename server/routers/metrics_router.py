@@ -0,0 +1,23 @@
+import os
+from fastapi import APIRouter, Response
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+from library.metrics import SessionCollector
+from services.session_registry import sessions
+
+router = APIRouter()
+
+# With several API workers (plus the session supervisor) every process writes its metrics
+# to PROMETHEUS_MULTIPROC_DIR and a scrape aggregates them
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    metrics_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(metrics_registry)
+else:
+    metrics_registry = REGISTRY
+metrics_registry.register(SessionCollector(sessions))
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint
+    """
+    return Response(generate_latest(metrics_registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,70 @@
+import json
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from models.database import SessionLocal
+from models.models import Speaker, Meeting, TranscriptSegment
+from schemas.speaker_schema import SpeakerSchema, EnrollSpeakerRequest
+from services.model_registry import registry
+from services.speakers import load_waveform, embed_segment, enroll, SPEAKER_MIN_SEGMENT_SECONDS
+from typing import List
+
+router = APIRouter()
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get("/speakers", response_model=List[SpeakerSchema])
+def get_speakers(db: Session = Depends(get_db)):
+    return db.query(Speaker).order_by(Speaker.name).all()
+
+@router.post("/speakers", response_model=SpeakerSchema)
+def enroll_speaker(request: EnrollSpeakerRequest, db: Session = Depends(get_db)):
+    """
+    Enrolls (or adds to) a speaker from segments of a diarized meeting and renames those segments
+    in transcript_segments and the meeting's transcript.
+    Later diarizations label matching segments with the name without clustering them.
+    """
+    if request.speaker is None and not request.seqs:
+        raise HTTPException(status_code=400, detail="Send speaker or seqs")
+    meeting = db.query(Meeting).filter(Meeting.meeting_id == request.meeting_id).first()
+    if not meeting or not meeting.audio_file:
+        raise HTTPException(status_code=404, detail="Meeting recording not found")
+
+    query = db.query(TranscriptSegment).filter(TranscriptSegment.meeting_id == request.meeting_id)
+    if request.speaker is not None:
+        query = query.filter(TranscriptSegment.speaker == request.speaker)
+    if request.seqs:
+        query = query.filter(TranscriptSegment.seq.in_(request.seqs))
+    segments = query.all()
+    usable = [segment for segment in segments
+              if segment.start is not None and segment.end is not None and segment.end - segment.start >= SPEAKER_MIN_SEGMENT_SECONDS]
+    if not usable:
+        raise HTTPException(status_code=400, detail=f"No segments with timestamps of at least {SPEAKER_MIN_SEGMENT_SECONDS}s")
+
+    embedding_model = registry.get("speaker_embedding")
+    waveform = load_waveform(meeting.audio_file)
+    embeddings = [embed_segment(embedding_model, waveform, segment.start, segment.end) for segment in usable]
+    speaker = enroll(db, request.name, embeddings)
+    for segment in segments:
+        segment.speaker = request.name
+    # Rebuild the transcript from the segments so both carry the new name
+    all_segments = db.query(TranscriptSegment).filter(TranscriptSegment.meeting_id == request.meeting_id).order_by(TranscriptSegment.seq).all()
+    meeting.transcript = json.dumps([
+        {"speaker": segment.speaker, "start": segment.start, "end": segment.end, "text": segment.text} for segment in all_segments
+    ])
+    db.commit()
+    db.refresh(speaker)
+    return speaker
+
+@router.delete("/speakers/{speaker_id}", response_model=dict)
+def delete_speaker(speaker_id: int, db: Session = Depends(get_db)):
+    speaker = db.query(Speaker).filter(Speaker.speaker_id == speaker_id).first()
+    if not speaker:
+        raise HTTPException(status_code=404, detail="Speaker not found")
+    db.delete(speaker)
+    db.commit()
+    return {"message": "Speaker deleted successfully"}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
-from typing import List
+from typing import List, Optional
 
 class Category(str, Enum):
     trivia = "trivia"
@@ -13,7 +13,12 @@ class Classification(BaseModel):
     category: Category
 
 class ChatRequest(BaseModel):
-    conversation: str
+    # Either the conversation text, or a meeting and the index of the word it starts at
+    # (words as split by text.split(/\s+/) on the client), the server slices the transcript
+    conversation: Optional[str] = None
+    meeting_id: Optional[int] = None
+    word_index: Optional[int] = Field(None, ge=0)
+    word_end: Optional[int] = Field(None, ge=0)
     question_type: str = None
     use_image: bool = False
     use_reasoning: bool = False
@@ -31,4 +36,17 @@ class Message(BaseModel):
     content: str
 
 class ChatCompletionsRequest(BaseModel):
-    messages: List[Message]
\ No newline at end of file
+    messages: List[Message]
+
+class ChatMessageRequest(BaseModel):
+    content: str
+
+class ChatMessageSchema(BaseModel):
+    seq: int
+    role: str
+    content: str
+
+class ChatSessionSchema(BaseModel):
+    meeting_id: int
+    summary: Optional[str] = None
+    messages: List[ChatMessageSchema]
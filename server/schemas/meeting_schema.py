@@ -4,8 +4,17 @@ from schemas.tag_schema import TagSchema
 
 class MeetingStart(BaseModel):
     audio_id: int
+    asr_tier: Optional[str] = None  # Key of ASR_TIERS in config.yaml, default model if not set
+
+class MeetingReplay(BaseModel):
+    audio_file: str  # WAV or FLAC, relative to REPLAY_DIRECTORY
+    speed: float = 1.0  # 1 is real time, 0 is unpaced
+    copies: int = 1  # Concurrent meetings replaying the same file
+    loop: bool = False
+    asr_tier: Optional[str] = None
 
 class MeetingBase(MeetingStart):
+    audio_id: Optional[int] = None  # Not set for replayed meetings
     meeting_id: int
     title: str
     # audio_id: int
@@ -19,5 +28,12 @@ class MeetingBase(MeetingStart):
 class MeetingTags(MeetingBase):
     tags: List[TagSchema] = []
 
+class TranscriptSegmentSchema(BaseModel):
+    seq: int
+    start: Optional[float] = None
+    end: Optional[float] = None
+    speaker: Optional[str] = None
+    text: str
+
 class UpdateTitleRequest(BaseModel):
     title: str
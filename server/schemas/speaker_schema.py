@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class SpeakerSchema(BaseModel):
+    speaker_id: int
+    name: str
+    n_segments: int
+
+class EnrollSpeakerRequest(BaseModel):
+    name: str
+    meeting_id: int
+    # Segments to enroll from, by their current speaker label (e.g. SPEAKER_01) or by seq
+    speaker: Optional[str] = None
+    seqs: Optional[List[int]] = None
@@ -0,0 +1,130 @@
+import time
+import wave
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+from library.config import get_config
+
+config = get_config()
+
+SAMPLE_RATE = 16000
+
+class ASRBackend(ABC):
+    """
+    Interface used by AudioService and diarize.
+    transcribe() takes a float32 16kHz mono array or an audio file path and returns
+    a whisper-style result: {"text": str, "segments": [{"start", "end", "text"}], "language": str}
+    """
+    name = "base"
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        # Meetings share one backend and whisper installs kv-cache hooks on the model per call,
+        # so callers decode one at a time with this held
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def transcribe(self, audio, **kwargs):
+        pass
+
+    def transcribe_locked(self, audio, **kwargs):
+        with self.lock:
+            return self.transcribe(audio, **kwargs)
+
+class WhisperBackend(ASRBackend):
+    """
+    openai-whisper as is, fp16 on CUDA and fp32 on CPU
+    """
+    name = "whisper"
+
+    def __init__(self, model_name, device=None):
+        super().__init__(model_name)
+        import whisper
+        from services.model_registry import get_torch_device
+        self.device = device or get_torch_device()
+        self.model = whisper.load_model(model_name, device=self.device)
+
+    def transcribe(self, audio, **kwargs):
+        kwargs.setdefault('fp16', self.device == "cuda")
+        return self.model.transcribe(audio, **kwargs)
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """
+    openai-whisper on CPU with the Linear layers dynamically quantized to int8.
+    Attention and MLP matmuls dominate decode time on CPU, int8 weights roughly halve it.
+    """
+    name = "whisper-int8"
+
+    def __init__(self, model_name, threads=config.get('ASR_THREADS')):
+        ASRBackend.__init__(self, model_name)
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads)
+        model = whisper.load_model(model_name, device="cpu")
+        # whisper subclasses nn.Linear only to cast weights to the input dtype, which is a no-op
+        # in fp32. quantize_dynamic matches exact types, so turn them back into plain nn.Linear
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear):
+                module.__class__ = torch.nn.Linear
+        self.model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.device = "cpu"
+
+class StubBackend(ASRBackend):
+    """
+    Deterministic backend for tests and benchmarks, no model weights needed.
+    Emits one word per STUB_WORD_SECONDS window with energy above STUB_THRESHOLD, named after
+    the window's position in the audio. STUB_RTF sleeps for that fraction of the audio duration
+    to simulate decode cost.
+    """
+    name = "stub"
+
+    def __init__(self, model_name="stub",
+                 word_seconds=config.get('STUB_WORD_SECONDS', .5),
+                 threshold=config.get('STUB_THRESHOLD', .01),
+                 rtf=config.get('STUB_RTF', 0)):
+        super().__init__(model_name)
+        self.word_seconds = word_seconds
+        self.threshold = threshold
+        self.rtf = rtf
+
+    def _load(self, audio):
+        if not isinstance(audio, str):
+            return audio
+        with wave.open(audio, 'rb') as wf:
+            frames = wf.readframes(wf.getnframes())
+            samples = np.frombuffer(frames, dtype=np.int16).reshape(-1, wf.getnchannels())
+        return samples.mean(axis=1).astype(np.float32) / 32768.0
+
+    def transcribe(self, audio, **kwargs):
+        audio = self._load(audio)
+        duration = len(audio) / SAMPLE_RATE
+        if self.rtf:
+            time.sleep(duration * self.rtf)
+
+        window = int(self.word_seconds * SAMPLE_RATE)
+        segments = []
+        for i in range(len(audio) // window):
+            chunk = audio[i * window:(i + 1) * window]
+            if np.sqrt(np.mean(chunk ** 2)) >= self.threshold:
+                segments.append({
+                    "start": i * self.word_seconds,
+                    "end": (i + 1) * self.word_seconds,
+                    "text": f" word{i}",
+                })
+        return {
+            "text": ''.join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": "en",
+        }
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+    StubBackend.name: StubBackend,
+}
+
+def create_asr_backend(model_name, backend=config.get('ASR_BACKEND', 'whisper')):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{backend}', expected one of {list(BACKENDS)}")
+    return BACKENDS[backend](model_name)
@@ -1,19 +1,20 @@
 import asyncio
-import io
 import wave
 import numpy as np
 import pyaudio
-from datetime import timedelta, datetime
 import os
+import time
 import threading
 import queue
-import yaml
+from services.transcript_journal import TranscriptJournal
+from services.decode_scheduler import DecodeScheduler
+from services.capture_engine import FORMAT
+from services.capture_sources import DeviceSource
+from library.config import get_config
+from library.word_index import WordIndex
+from library.metrics import ASR_DECODE_SECONDS, ASR_AUDIO_SECONDS
 
-# Load the configuration from config.yaml
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
-
-FORMAT = pyaudio.paInt16
+config = get_config()
 
 def rms_energy(samples: np.ndarray) -> float:
     """
@@ -23,139 +24,245 @@ def rms_energy(samples: np.ndarray) -> float:
 
 class AudioService:
     def __init__(self, audio_device_info,
-                 whisper_model, meeting_id,
+                 asr_backend, meeting_id,
                  sample_rate=16000, chunk_size=1024,
                  transcribe_rate=config.get('TRANSCRIBE_RATE', .5),
                  silence_seconds=config.get('SILENCE_SECONDS', 1),
-                 threshold=config.get('THRESHOLD', 0),
+                 threshold=config.get('THRESHOLD', 300),
                  max_record_time=config.get('MAX_RECORD_TIME', 30),
-                 output_dir=config.get('OUTPUT_DIR', "./recordings/")):
+                 behind_record_time=config.get('BEHIND_RECORD_TIME', 10),
+                 output_dir=config.get('OUTPUT_DIR', "./recordings/"),
+                 segments=None,
+                 source=None,
+                 on_commit=None):
 
         # audio_device_info: list of objects with name, channel, n_channels
         self.audio_device_info = audio_device_info
-        self.whisper_model = whisper_model
+        self.asr_backend = asr_backend
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
-        self.transcribe_rate = timedelta(seconds=transcribe_rate)
         self.silence_seconds = silence_seconds
         self.threshold = threshold
         self.max_record_time = max_record_time
-        self.transcript = ''
+        self.behind_record_time = behind_record_time
+        self.scheduler = DecodeScheduler(min_interval=transcribe_rate)
+        # Committed phrases, also appended to the on-disk journal
+        # Seeded with the journal's segments when a meeting is resumed after a restart
+        self.segments = list(segments or [])
+        self.transcript = ''.join(segment['text'] + '\n' for segment in self.segments)
+        # Word offsets into the transcript, so /chat can slice from the word the user clicked
+        self.words = WordIndex(self.transcript)
         self.current_phrase = ''
+        self.samples_seen = int(self.segments[-1]['end'] * sample_rate) if self.segments else 0
+        # Decode counters, used by the benchmarks
+        self.decode_count = 0
+        self.decode_seconds = 0.0
+        self.decoded_until = self.samples_seen  # samples covered by the latest transcription
+        self.dropped_samples = 0  # skipped while too far behind
         self.running = False
         self.output_dir = output_dir
         self.meeting_id = meeting_id
         self.data_queue = queue.Queue()
-        self.record_thread = None
-
-    def _find_device_index(self, name):
-        pa = pyaudio.PyAudio()
-        for i in range(pa.get_device_count()):
-            info = pa.get_device_info_by_index(i)
-            if name.lower() in info.get('name', '').lower():
-                pa.terminate()
-                return i
-        pa.terminate()
-        raise ValueError(f"Audio device '{name}' not found")
-
-    def recording_thread(self):
+        # Live devices unless a source (e.g. a file replay) is given
+        self.source = source or DeviceSource(audio_device_info, sample_rate, chunk_size)
+        self.recording = False
+        self.journal = TranscriptJournal(meeting_id)
+        self.stopped = threading.Event()
+        self.stopped.set()
+        # Called with (meeting_id, start word, end word, text) for each committed phrase
+        self.on_commit = on_commit
+
+    def _commit_phrase(self, start_sample, end_sample):
+        # The transcript ends with a newline, so the phrase starts at its last (empty) word
+        start_word = len(self.words) - 1
+        self.transcript += self.current_phrase + '\n'
+        self.words.append(self.current_phrase + '\n')
+        if self.on_commit and self.current_phrase:
+            self.on_commit(self.meeting_id, start_word, len(self.words) - 1, self.current_phrase)
+        if self.current_phrase:
+            segment = {
+                "seq": len(self.segments),
+                "start": start_sample / self.sample_rate,
+                "end": end_sample / self.sample_rate,
+                "text": self.current_phrase,
+            }
+            self.segments.append(segment)
+            self.journal.append(segment)
+        self.current_phrase = ''
+
+    def start_recording(self):
         """
-        Thread function to capture audio and enqueue it for processing, and save to WAV file.
+        Starts the capture source. Mixed frames are saved to the WAV file and enqueued for processing.
         """
-        pa = pyaudio.PyAudio()
-
-        # Open streams for each audio device
-        streams = []
-        for dev in self.audio_device_info:
-            idx = self._find_device_index(dev.name)
-            stream = pa.open(format=FORMAT,
-                             channels=dev.n_channels,
-                             rate=self.sample_rate,
-                             input=True,
-                             input_device_index=idx,
-                             frames_per_buffer=self.chunk_size)
-            streams.append(stream)
-
         # Create a wave file to save the mixed audio
+        os.makedirs(self.output_dir, exist_ok=True)
         wav_filename = os.path.join(self.output_dir, f"{self.meeting_id}.wav")
-        wf = wave.open(wav_filename, 'wb')
-        wf.setnchannels(1)
-        wf.setsampwidth(pa.get_sample_size(FORMAT))
-        wf.setframerate(self.sample_rate)
-        
-        # Start recording, mixing, and saving audio
-        # Write to the queue for processing
-        while self.running:
-            channel_audios = []
-            for stream, dev in zip(streams, self.audio_device_info):
-                raw_audio = np.frombuffer(stream.read(self.chunk_size), dtype=np.int16)
-                channel_audio = raw_audio[dev.channel::dev.n_channels]
-                channel_audios.append(channel_audio)
-            mixed_audio = np.mean(channel_audios, axis=0).astype(np.int16).tobytes()
-            wf.writeframes(mixed_audio)
-            self.data_queue.put(mixed_audio)
-
-        # Close the wave file and streams
-        wf.close()
-        for stream in streams:
-            stream.stop_stream()
-            stream.close()
-        pa.terminate()
+        self.wav_file = wave.open(wav_filename, 'wb')
+        self.wav_file.setnchannels(1)
+        self.wav_file.setsampwidth(pyaudio.get_sample_size(FORMAT))
+        self.wav_file.setframerate(self.sample_rate)
+
+        self.source.start(self._on_frame)
+        self.recording = True
+
+    def _on_frame(self, mixed_audio):
+        # Runs on the capture source's thread
+        self.wav_file.writeframes(mixed_audio)
+        self.data_queue.put(mixed_audio)
+
+    def stop_recording(self):
+        if self.recording:
+            self.recording = False
+            self.source.stop()
+            self.wav_file.close()
+
+    def capture_stats(self):
+        """
+        :return: source specific counters, for devices frames mixed and per-device overrun/underrun/drift in samples
+        """
+        return self.source.stats()
+
+    def backlog_seconds(self):
+        """
+        :return: seconds of audio captured but not transcribed yet
+        """
+        queued = self.data_queue.qsize() * self.chunk_size
+        return (queued + self.samples_seen - self.decoded_until) / self.sample_rate
+
+    def transcription_status(self):
+        backlog = self.backlog_seconds()
+        audio_seconds = self.samples_seen / self.sample_rate
+        return {
+            "state": "behind" if self.scheduler.is_behind(backlog) else "ok",
+            "backlog_seconds": round(backlog, 2),
+            "decode_interval": round(self.scheduler.interval, 2),
+            "real_time_factor": round(self.decode_seconds / audio_seconds, 3) if audio_seconds else None,
+            "skipped_ticks": self.scheduler.skipped_ticks,
+            "dropped_seconds": round(self.dropped_samples / self.sample_rate, 2),
+        }
+
+    def _transcribe(self, buffer):
+        # Runs in a worker thread, the model lock is shared with the other meetings
+        audio_np = np.frombuffer(bytes(buffer), dtype=np.int16).astype(np.float32) / 32768.0
+        return self.asr_backend.transcribe_locked(audio_np, language='en')
+
+    async def _decode(self, buffer):
+        decode_start = time.perf_counter()
+        decoded_until = self.samples_seen
+        result = await asyncio.to_thread(self._transcribe, buffer)
+        decode_time = time.perf_counter() - decode_start
+        ASR_DECODE_SECONDS.labels(self.asr_backend.name).observe(decode_time)
+        self.scheduler.record_decode(decode_time)
+        self.decode_seconds += decode_time
+        self.decode_count += 1
+        self.decoded_until = decoded_until
+        self.current_phrase = result['text'].strip()
+
+    def _drop_backlog(self):
+        """
+        Too far behind to catch up: skip the oldest queued audio down to behind_seconds of backlog.
+        It's still in the recording, so diarize can transcribe it later.
+        """
+        keep = int(self.scheduler.behind_seconds * self.sample_rate / self.chunk_size)
+        while self.data_queue.qsize() > keep:
+            try:
+                data = self.data_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.samples_seen += len(data) // 2
+            self.dropped_samples += len(data) // 2
+        print(f"Meeting {self.meeting_id} fell behind, skipped to {self.dropped_samples / self.sample_rate:.1f}s of dropped audio")
 
     async def start(self):
         buffer = bytearray()
-        samples_with_silence = 0
+        buffer_start = self.samples_seen
+        buffer_has_speech = False
+        new_speech = False  # speech arrived since the last decode
+        silent_frames = 0
         silence_limit = int(self.sample_rate / self.chunk_size * self.silence_seconds)
-        next_transcribe_time = datetime.utcnow() + self.transcribe_rate
+        next_decode_time = time.monotonic() + self.scheduler.interval
 
         self.running = True
+        self.stopped.clear()
+
+        try:
+            # Opening the device streams can take a moment, keep it off the event loop
+            await asyncio.to_thread(self.start_recording)
+            if not self.running:
+                # Stopped while the streams were opening
+                self.stop_recording()
+
+            while self.running:
+                if time.monotonic() >= next_decode_time:
+                    if self.scheduler.should_drop(self.backlog_seconds()):
+                        if buffer_has_speech:
+                            self._commit_phrase(buffer_start, self.samples_seen)
+                        self._drop_backlog()
+                        buffer, buffer_start, buffer_has_speech, new_speech = bytearray(), self.samples_seen, False, False
+                        self.decoded_until = self.samples_seen
+
+                    # Shorter phrases while behind, each decode re-transcribes the whole phrase
+                    behind = self.scheduler.is_behind(self.backlog_seconds())
+                    max_samples = (self.behind_record_time if behind else self.max_record_time) * self.sample_rate
 
-        # Start the recording thread
-        self.record_thread = threading.Thread(target=self.recording_thread)
-        self.record_thread.start()
-
-        while self.running:
-            now = datetime.utcnow()
-            if now >= next_transcribe_time:
-                next_transcribe_time = now + self.transcribe_rate
-                while not self.data_queue.empty():
-                    data = self.data_queue.get()
-
-                    energy = rms_energy(np.frombuffer(data, dtype=np.int16))
-                    samples_with_silence += 1 if energy < self.threshold else 0
-                    
-                    # If silence_limit is reached, or greater than 30 seconds, reset buffer
-                    if samples_with_silence > silence_limit or len(buffer) > self.max_record_time * self.sample_rate:
-                        buffer = bytearray()
-                        self.transcript += self.current_phrase + '\n'
-                        self.current_phrase = ''
-                    
-                    buffer.extend(data)
-
-                # Turn buffer into a WAV file for easy processing
-                audio_data = bytes(buffer)
-                wav_buf = io.BytesIO()
-                wf = wave.open(wav_buf, 'wb')
-                wf.setnchannels(1)
-                wf.setsampwidth(pyaudio.get_sample_size(FORMAT))
-                wf.setframerate(self.sample_rate)
-                wf.writeframes(audio_data)
-                wf.close()
-
-                # Read for model
-                wav_buf.seek(0)
-                raw_audio = wave.open(wav_buf).readframes(len(audio_data)//2)
-                audio_np = np.frombuffer(raw_audio, dtype=np.int16).astype(np.float32) / 32768.0
-                result = self.whisper_model.transcribe(audio_np, language='en')
-                self.current_phrase = result['text'].strip()
-
-            await asyncio.sleep(.1)
-    
+                    while not self.data_queue.empty():
+                        data = self.data_queue.get()
+                        if rms_energy(np.frombuffer(data, dtype=np.int16)) < self.threshold:
+                            silent_frames += 1
+                        else:
+                            silent_frames = 0
+                            buffer_has_speech = new_speech = True
+
+                        buffer.extend(data)
+                        self.samples_seen += len(data) // 2
+                        ASR_AUDIO_SECONDS.inc(len(data) / 2 / self.sample_rate)
+
+                        # End of the phrase after silence_seconds of silence, or when it gets too long
+                        if buffer_has_speech and (silent_frames > silence_limit or len(buffer) // 2 > max_samples):
+                            if new_speech:
+                                # Decode the end of the phrase before committing it
+                                await self._decode(buffer)
+                            self._commit_phrase(buffer_start, self.samples_seen)
+                            buffer, buffer_start, buffer_has_speech, new_speech = bytearray(), self.samples_seen, False, False
+                        elif not buffer_has_speech and silent_frames > silence_limit:
+                            # Don't carry leading silence into the next phrase
+                            buffer, buffer_start = bytearray(), self.samples_seen
+
+                    if new_speech:
+                        await self._decode(buffer)
+                        new_speech = False
+                    else:
+                        # Nothing new to transcribe
+                        self.scheduler.record_skip()
+                        self.decoded_until = self.samples_seen
+                    next_decode_time = time.monotonic() + self.scheduler.interval
+
+                await asyncio.sleep(.1)
+        except Exception as e:
+            # Nothing awaits this coroutine, make sure the failure shows up
+            print(f"Transcription loop of meeting {self.meeting_id} failed: {e!r}")
+            self.running = False
+            self.stop_recording()
+            raise
+        finally:
+            # Commit whatever is left so the journal holds the full transcript
+            if buffer_has_speech:
+                self._commit_phrase(buffer_start, self.samples_seen)
+            self.journal.close()
+            self.stopped.set()
 
     def stop(self):
         self.running = False
-        if self.record_thread:
-            self.record_thread.join()
+        self.stop_recording()
+        # Wait for start() to commit the last phrase and close the journal
+        self.stopped.wait(timeout=30)
+        self.journal.close()
 
     def get_transcription(self):
-        return self.transcript + self.current_phrase
\ No newline at end of file
+        return self.transcript + self.current_phrase
+
+    def slice_words(self, start, end=None):
+        """
+        :return: words start to end of get_transcription(), as split by the client
+        """
+        return self.words.slice(start, end, tail=self.current_phrase)
\ No newline at end of file
@@ -0,0 +1,211 @@
+import time
+import threading
+import numpy as np
+import pyaudio
+from services.resampler import PolyphaseResampler
+
+FORMAT = pyaudio.paInt16
+
+class RingBuffer:
+    """
+    Single-producer single-consumer ring of int16 samples.
+    The PortAudio callback only advances write_pos and the mixer only advances read_pos,
+    so neither side takes a lock. Positions are totals, never wrapped.
+    """
+    def __init__(self, capacity):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.write_pos = 0
+        self.read_pos = 0
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, samples):
+        """
+        :return: number of samples dropped because the ring was full
+        """
+        n = min(len(samples), self.capacity - self.available())
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:n - first] = samples[first:n]
+        self.write_pos += n
+        return len(samples) - n
+
+    def read_into(self, out):
+        """
+        Fills the front of out with up to len(out) samples.
+        :return: number of samples read
+        """
+        n = min(len(out), self.available())
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:n] = self.buffer[:n - first]
+        self.read_pos += n
+        return n
+
+    def skip(self, n):
+        self.read_pos += min(n, self.available())
+
+class DeviceStream:
+    """
+    One PyAudio input stream in callback mode, writing its configured channel into a ring buffer.
+    The device is opened at device_rate, its native rate, and each block is resampled to sample_rate
+    before it goes in the ring, so devices with different rates mix frame for frame.
+    """
+    def __init__(self, pa, device_index, device_info, device_rate, sample_rate, frame_size, ring_frames, on_data):
+        self.name = device_info.name
+        self.channel = device_info.channel
+        self.n_channels = device_info.n_channels
+        self.ring = RingBuffer(frame_size * ring_frames)
+        self.on_data = on_data
+        self.overruns = 0  # samples dropped, by PortAudio or because the ring was full
+        self.underruns = 0  # samples padded with silence because the device was late
+        self.drift_drops = 0  # samples skipped to realign with the other devices
+        try:
+            self.stream = self._open(pa, device_index, device_rate, sample_rate, frame_size)
+        except OSError as e:
+            if device_rate == sample_rate:
+                raise
+            # Some drivers report a default rate they won't open at, let PortAudio convert instead
+            print(f"Couldn't open {self.name} at {device_rate}Hz ({e}), opening at {sample_rate}Hz")
+            device_rate = sample_rate
+            self.stream = self._open(pa, device_index, device_rate, sample_rate, frame_size)
+        self.device_rate = device_rate
+        self.resampler = PolyphaseResampler(device_rate, sample_rate) if device_rate != sample_rate else None
+
+    def _open(self, pa, device_index, device_rate, sample_rate, frame_size):
+        # Same block duration at any rate
+        return pa.open(format=FORMAT,
+                       channels=self.n_channels,
+                       rate=device_rate,
+                       input=True,
+                       input_device_index=device_index,
+                       frames_per_buffer=round(frame_size * device_rate / sample_rate),
+                       stream_callback=self._callback,
+                       start=False)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.overruns += frame_count
+        samples = np.frombuffer(in_data, dtype=np.int16)[self.channel::self.n_channels]
+        if self.resampler:
+            samples = self.resampler.process(samples)
+        self.overruns += self.ring.write(samples)
+        self.on_data()
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        self.stream.start_stream()
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+
+    def stats(self):
+        return {
+            "rate": self.device_rate,
+            "overruns": self.overruns,
+            "underruns": self.underruns,
+            "drift_drops": self.drift_drops,
+            "buffered": self.ring.available(),
+        }
+
+class CaptureEngine:
+    """
+    Captures every device in callback mode and mixes them on a single mixer thread.
+    Each frame is emitted once every device has frame_size samples buffered. A device that
+    is more than max_wait_frames late is padded with silence (underrun), a device more than
+    max_lag_frames ahead of the slowest one has its excess skipped so devices don't drift apart.
+    on_frame receives the mixed int16 frame as bytes.
+    devices are (PortAudio index, device info, native rate) tuples.
+    """
+    def __init__(self, pa, devices, sample_rate, frame_size, on_frame,
+                 ring_frames=64, max_wait_frames=4, max_lag_frames=8):
+        self.frame_size = frame_size
+        self.frame_seconds = frame_size / sample_rate
+        self.on_frame = on_frame
+        self.max_wait = max_wait_frames * self.frame_seconds
+        self.max_lag = frame_size * max_lag_frames
+        self.data_ready = threading.Event()
+        self.running = False
+        self.frames_mixed = 0
+        self.mixer_thread = None
+        self.streams = [
+            DeviceStream(pa, index, info, rate, sample_rate, frame_size, ring_frames, self.data_ready.set)
+            for index, info, rate in devices
+        ]
+
+        # Preallocated so mixing doesn't allocate per frame
+        self.device_frame = np.zeros(frame_size, dtype=np.int16)
+        self.mix = np.zeros(frame_size, dtype=np.float32)
+        self.mixed = np.zeros(frame_size, dtype=np.int16)
+
+    def start(self):
+        self.running = True
+        self.mixer_thread = threading.Thread(target=self._mixer_loop, daemon=True, name="capture-mixer")
+        self.mixer_thread.start()
+        for stream in self.streams:
+            stream.start()
+
+    def stop(self):
+        self.running = False
+        self.data_ready.set()
+        if self.mixer_thread:
+            self.mixer_thread.join()
+        for stream in self.streams:
+            stream.close()
+
+    def _realign(self):
+        slowest = min(stream.ring.available() for stream in self.streams)
+        for stream in self.streams:
+            excess = stream.ring.available() - slowest - self.max_lag
+            if excess > 0:
+                stream.ring.skip(excess)
+                stream.drift_drops += excess
+
+    def _mix_frame(self):
+        self.mix.fill(0)
+        for stream in self.streams:
+            n = stream.ring.read_into(self.device_frame)
+            if n < self.frame_size:
+                self.device_frame[n:] = 0
+                stream.underruns += self.frame_size - n
+            np.add(self.mix, self.device_frame, out=self.mix)
+        np.multiply(self.mix, 1 / len(self.streams), out=self.mix)
+        np.copyto(self.mixed, self.mix, casting='unsafe')
+        self.frames_mixed += 1
+        self.on_frame(self.mixed.tobytes())
+
+    def _mixer_loop(self):
+        if not self.streams:
+            return
+        late_since = None
+        while self.running:
+            self.data_ready.clear()
+            ready = [stream.ring.available() >= self.frame_size for stream in self.streams]
+            if all(ready):
+                self._realign()
+                self._mix_frame()
+                late_since = None
+                continue
+            if any(ready):
+                now = time.monotonic()
+                if late_since is None:
+                    late_since = now
+                elif now - late_since > self.max_wait:
+                    # A device stopped delivering, don't hold up the others. late_since stays set,
+                    # so every frame the others deliver is mixed (the late one padded with silence)
+                    # until it catches up
+                    self._realign()
+                    self._mix_frame()
+                    continue
+            self.data_ready.wait(self.frame_seconds)
+
+    def stats(self):
+        return {
+            "frames_mixed": self.frames_mixed,
+            "devices": {stream.name: stream.stats() for stream in self.streams},
+        }
@@ -0,0 +1,292 @@
+import os
+import time
+import wave
+import threading
+import multiprocessing
+from abc import ABC, abstractmethod
+import numpy as np
+from services.capture_engine import CaptureEngine
+from services.device_registry import device_registry
+from services.shm_ring import SharedAudioRing
+from library.config import get_config
+
+config = get_config()
+
+class CaptureSource(ABC):
+    """
+    Where an AudioService gets its audio from. A source calls on_frame with mixed
+    mono int16 frames (as bytes) at the service's sample rate, from its own thread.
+    """
+    @abstractmethod
+    def start(self, on_frame):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {}
+
+class DeviceSource(CaptureSource):
+    """
+    Live capture from the configured PyAudio devices, opened at their native rates
+    unless native_rate is off, in which case PortAudio converts to sample_rate
+    """
+    def __init__(self, audio_device_info, sample_rate, frame_size,
+                 native_rate=config.get('CAPTURE_NATIVE_RATE', True)):
+        self.audio_device_info = audio_device_info
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.native_rate = native_rate
+        self.capture = None
+
+    def start(self, on_frame):
+        # Resolve devices before taking a lease so a rescan can still pick up new devices
+        devices = []
+        for dev in self.audio_device_info:
+            info = device_registry.find(dev.name)
+            rate = int(info['defaultSampleRate']) if self.native_rate else self.sample_rate
+            devices.append((info['index'], dev, rate))
+        pa = device_registry.acquire()
+        try:
+            self.capture = CaptureEngine(pa, devices, self.sample_rate, self.frame_size, on_frame)
+        except Exception:
+            device_registry.release()
+            raise
+        self.capture.start()
+
+    def stop(self):
+        if self.capture and self.capture.running:
+            self.capture.stop()
+            device_registry.release()
+
+    def stats(self):
+        return self.capture.stats() if self.capture else {}
+
+def load_audio_file(path, sample_rate):
+    """
+    :return: mono int16 samples at sample_rate from a WAV or FLAC file
+    """
+    if path.lower().endswith('.flac'):
+        # Only needed for FLAC replays
+        import soundfile
+        samples, file_rate = soundfile.read(path, dtype='int16', always_2d=True)
+    else:
+        with wave.open(path, 'rb') as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit WAV files are supported")
+            file_rate = wf.getframerate()
+            samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).reshape(-1, wf.getnchannels())
+
+    mono = samples.mean(axis=1)
+    if file_rate != sample_rate:
+        positions = np.arange(int(len(mono) * sample_rate / file_rate)) * (file_rate / sample_rate)
+        mono = np.interp(positions, np.arange(len(mono)), mono)
+    return mono.astype(np.int16)
+
+class FileReplaySource(CaptureSource):
+    """
+    Replays an audio file as if it were a live device, for reproducing meetings and load tests.
+    speed=1 is real time, 2 is twice as fast, 0 emits frames without any pacing.
+    frame_times maps the frame count to the wall time it was emitted, for latency measurements.
+    """
+    def __init__(self, path, sample_rate, frame_size, speed=1.0, loop=False, samples=None):
+        self.path = path
+        # Concurrent copies of a replay can share the decoded samples
+        self.samples = samples if samples is not None else load_audio_file(path, sample_rate)
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.speed = speed
+        self.loop = loop
+        self.running = False
+        self.finished = threading.Event()
+        self.frames_emitted = 0
+        self.frame_times = []
+        self.thread = None
+
+    def start(self, on_frame):
+        self.running = True
+        self.thread = threading.Thread(target=self._replay, args=(on_frame,), daemon=True, name="capture-replay")
+        self.thread.start()
+
+    def _replay(self, on_frame):
+        frame_seconds = self.frame_size / self.sample_rate
+        n_frames = len(self.samples) // self.frame_size
+        start_time = time.monotonic()
+        while self.running and n_frames:
+            i = self.frames_emitted % n_frames
+            if i == 0 and self.frames_emitted and not self.loop:
+                break
+            if self.speed:
+                # Pace against the start time so timing errors don't accumulate
+                delay = start_time + self.frames_emitted * frame_seconds / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            on_frame(self.samples[i * self.frame_size:(i + 1) * self.frame_size].tobytes())
+            self.frame_times.append(time.monotonic())
+            self.frames_emitted += 1
+        self.finished.set()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def stats(self):
+        return {
+            "file": os.path.basename(self.path),
+            "speed": self.speed,
+            "frames_emitted": self.frames_emitted,
+            "finished": self.finished.is_set(),
+        }
+
+def run_capture_process(ring_name, conn, audio_device_info, sample_rate, frame_size, replay=None):
+    """
+    Entry point of a capture process. Runs the devices (or a replay) and writes the mixed
+    frames into the SharedAudioRing. Answers (request_id, "stats") and (request_id, "stop")
+    on conn with (request_id, stats) until told to stop or the parent goes away.
+    """
+    ring = SharedAudioRing(name=ring_name)
+    if replay:
+        source = FileReplaySource(replay['path'], sample_rate, frame_size, replay['speed'], replay['loop'])
+    else:
+        source = DeviceSource(audio_device_info, sample_rate, frame_size)
+    try:
+        source.start(lambda frame: ring.write(np.frombuffer(frame, dtype=np.int16)))
+    except Exception as e:
+        conn.send(e)
+        ring.close()
+        return
+    conn.send(None)
+
+    request_id = None
+    try:
+        while True:
+            if conn.poll(.2):
+                request_id, command = conn.recv()
+                if command == "stop":
+                    break
+                conn.send((request_id, source.stats()))
+            finished = getattr(source, 'finished', None)
+            if finished is not None and finished.is_set():
+                ring.mark_closed()
+    except (EOFError, OSError):
+        # Parent died
+        pass
+    finally:
+        source.stop()
+        ring.mark_closed()
+        try:
+            conn.send((request_id, source.stats()))
+        except OSError:
+            pass
+        ring.close()
+
+class SharedMemorySource(CaptureSource):
+    """
+    Runs the capture in its own process, which writes into a shared memory ring that is
+    read back here on a thread. The real-time audio path doesn't share a GIL with ASR or
+    the API, a slow decode can only make the ring fill up (CAPTURE_RING_SECONDS) and
+    drop audio, never make the devices overrun.
+    """
+    def __init__(self, audio_device_info, sample_rate, frame_size, replay=None,
+                 ring_seconds=config.get('CAPTURE_RING_SECONDS', 10)):
+        self.audio_device_info = list(audio_device_info)
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.replay = replay
+        self.ring_seconds = ring_seconds
+        self.ring = None
+        self.process = None
+        self.conn = None
+        self.conn_lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.finished = threading.Event()
+        self.position = 0
+        self.dropped = 0
+        self.request_id = 0
+        self.final_stats = None
+
+    def start(self, on_frame):
+        self.ring = SharedAudioRing(capacity=int(self.ring_seconds * self.sample_rate))
+        # Spawn, the parent has model and event loop threads that shouldn't be forked
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_capture_process,
+            args=(self.ring.name, child_conn, self.audio_device_info, self.sample_rate, self.frame_size, self.replay),
+            daemon=True, name="capture")
+        self.process.start()
+        child_conn.close()
+
+        # Wait for the devices to open so errors surface like they do for DeviceSource
+        error = self.conn.recv() if self.conn.poll(30) else TimeoutError("Capture process didn't start")
+        if error is not None:
+            self._cleanup()
+            raise error
+        self.running = True
+        self.thread = threading.Thread(target=self._read, args=(on_frame,), daemon=True, name="capture-shm-reader")
+        self.thread.start()
+
+    def _read(self, on_frame):
+        frame_seconds = self.frame_size / self.sample_rate
+        pending = np.empty(0, dtype=np.int16)
+        while self.running:
+            samples, self.position, dropped = self.ring.read(self.position, self.ring.capacity)
+            self.dropped += dropped
+            if len(samples):
+                pending = np.concatenate((pending, samples))
+                n_frames = len(pending) // self.frame_size
+                for i in range(n_frames):
+                    on_frame(pending[i * self.frame_size:(i + 1) * self.frame_size].tobytes())
+                pending = pending[n_frames * self.frame_size:]
+            elif self.ring.closed or not self.process.is_alive():
+                break
+            else:
+                time.sleep(frame_seconds / 2)
+        self.finished.set()
+
+    def _request(self, command, timeout):
+        with self.conn_lock:
+            self.request_id += 1
+            try:
+                self.conn.send((self.request_id, command))
+                deadline = time.monotonic() + timeout
+                # Skip late replies to requests that already timed out
+                while self.conn.poll(max(0, deadline - time.monotonic())):
+                    request_id, stats = self.conn.recv()
+                    if request_id == self.request_id:
+                        return stats
+            except (EOFError, OSError):
+                pass
+            return None
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.final_stats = self._request("stop", 5)
+        self.thread.join()
+        self._cleanup()
+
+    def _cleanup(self):
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.ring.close()
+
+    def stats(self):
+        if self.running:
+            capture = self._request("stats", 2) or {}
+        else:
+            capture = self.final_stats or {}
+        return dict(capture, ring={
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "capacity_seconds": self.ring_seconds,
+            "lag_samples": self.ring.written - self.position if self.running else 0,
+            "dropped_samples": self.dropped,
+        })
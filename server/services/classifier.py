@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from library.config import get_config
+from library.prompts import ClassifyPrompt
+from library.metrics import SPECULATIVE_CLASSIFICATIONS
+from schemas.chat_schema import Classification
+from services.instant_providers import instant_providers
+from services.provider_scheduler import INTERACTIVE, BACKGROUND
+
+config = get_config()
+
+# Classify utterances as they are committed so /chat doesn't have to when a recent word is clicked
+SPECULATIVE_CLASSIFY = config.get('SPECULATIVE_CLASSIFY', True)
+# Shorter utterances ("okay", "sounds good") aren't worth a provider call
+SPECULATIVE_MIN_WORDS = config.get('SPECULATIVE_MIN_WORDS', 5)
+# Utterances kept per meeting, older clicks are classified on demand
+SPECULATIVE_UTTERANCES = config.get('SPECULATIVE_UTTERANCES', 8)
+
+def classify_conversation(conversation, priority=INTERACTIVE, cancel=None):
+    prompt = ClassifyPrompt(conversation)
+    completion = instant_providers.create(priority, "classify", Classification, prompt.get_messages(), cancel=cancel)
+    return completion.category.value
+
+class SpeculativeClassifier:
+    """
+    Classifies each committed utterance of a live meeting in the background, at background
+    priority so it only uses spare provider quota. Results are keyed by the utterance's
+    word range in the live transcript, the same indexes the client sends as word_index.
+    """
+    def __init__(self, min_words=SPECULATIVE_MIN_WORDS, max_utterances=SPECULATIVE_UTTERANCES):
+        self.min_words = min_words
+        self.max_utterances = max_utterances
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-classify")
+        self.lock = threading.Lock()
+        # meeting_id -> {start word: (end word, question type)}
+        self.results = {}
+
+    def start(self, meeting_id):
+        with self.lock:
+            self.results[meeting_id] = {}
+
+    def forget(self, meeting_id):
+        # Stored transcripts skip empty phrases, so word indexes change once the meeting stops
+        with self.lock:
+            self.results.pop(meeting_id, None)
+
+    def submit(self, meeting_id, start, end, text):
+        """
+        AudioService commit hook, text is words start to end of the live transcript
+        """
+        if end - start >= self.min_words:
+            self.executor.submit(self._classify, meeting_id, start, end, text)
+
+    def _classify(self, meeting_id, start, end, text):
+        with self.lock:
+            utterances = self.results.get(meeting_id)
+            # Stopped, or enough newer utterances came in that this one would be evicted anyway
+            if utterances is None or (utterances and len(utterances) >= self.max_utterances and start < min(utterances)):
+                return
+        try:
+            question_type = classify_conversation(text, BACKGROUND)
+        except Exception as e:
+            SPECULATIVE_CLASSIFICATIONS.labels("failed").inc()
+            print(f"Speculative classification failed for meeting {meeting_id}: {e}")
+            return
+        SPECULATIVE_CLASSIFICATIONS.labels("classified").inc()
+
+        with self.lock:
+            utterances = self.results.get(meeting_id)
+            if utterances is None:
+                return
+            utterances[start] = (end, question_type)
+            # Calls can finish out of order, evict the earliest utterance
+            while len(utterances) > self.max_utterances:
+                del utterances[min(utterances)]
+
+    def lookup(self, meeting_id, word_index, word_end=None):
+        """
+        :return: question type of the utterance containing word_index, None if it wasn't classified
+            or words word_index to word_end run past it
+        """
+        with self.lock:
+            for start, (end, question_type) in self.results.get(meeting_id, {}).items():
+                if start <= word_index < end:
+                    return question_type if word_end is None or word_end <= end else None
+        return None
+
+speculative_classifier = SpeculativeClassifier()
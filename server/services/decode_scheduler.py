@@ -0,0 +1,46 @@
+from library.config import get_config
+
+config = get_config()
+
+class DecodeScheduler:
+    """
+    Decode cadence of one meeting. Every decode re-transcribes the current phrase, so the
+    interval between decodes is stretched until decoding takes about target_rtf of real time,
+    from min_interval (TRANSCRIBE_RATE) up to max_interval. Decode time includes waiting for
+    the shared model, so meetings back off when the model is busy with other meetings.
+
+    A meeting is behind once more than behind_seconds of audio is waiting to be transcribed,
+    past drop_seconds the oldest audio is skipped instead of lagging further.
+    """
+    def __init__(self,
+                 min_interval=config.get('TRANSCRIBE_RATE', .5),
+                 max_interval=config.get('MAX_TRANSCRIBE_INTERVAL', 3),
+                 target_rtf=config.get('ASR_TARGET_RTF', .5),
+                 behind_seconds=config.get('ASR_BEHIND_SECONDS', 5),
+                 drop_seconds=config.get('ASR_DROP_SECONDS', 20),
+                 smoothing=.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_rtf = target_rtf
+        self.behind_seconds = behind_seconds
+        self.drop_seconds = drop_seconds
+        self.smoothing = smoothing
+        self.interval = min_interval
+        self.decode_seconds = None  # moving average
+        self.skipped_ticks = 0
+
+    def record_decode(self, seconds):
+        if self.decode_seconds is None:
+            self.decode_seconds = seconds
+        else:
+            self.decode_seconds += self.smoothing * (seconds - self.decode_seconds)
+        self.interval = min(self.max_interval, max(self.min_interval, self.decode_seconds / self.target_rtf))
+
+    def record_skip(self):
+        self.skipped_ticks += 1
+
+    def is_behind(self, backlog_seconds):
+        return backlog_seconds > self.behind_seconds
+
+    def should_drop(self, backlog_seconds):
+        return backlog_seconds > self.drop_seconds
@@ -0,0 +1,80 @@
+import time
+import threading
+import pyaudio
+from library.config import get_config
+
+config = get_config()
+
+class DeviceRegistry:
+    """
+    One long-lived PortAudio context shared by audio_router and AudioService, with a cached
+    view of the input devices. The cache is rescanned on demand or once it is older than
+    refresh_seconds.
+
+    PortAudio only notices hot-plugged devices after it is re-initialized, which invalidates
+    any open stream, so the context is only recreated while no capture holds a lease on it.
+    """
+    def __init__(self, refresh_seconds=config.get('DEVICE_REFRESH_SECONDS', 30)):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.RLock()
+        self.pa = None
+        self.inputs = []  # device info dicts with maxInputChannels > 0, in index order
+        self.leases = 0
+        self.refreshed_at = None
+
+    def refresh(self):
+        with self.lock:
+            if self.pa is None or self.leases == 0:
+                if self.pa is not None:
+                    self.pa.terminate()
+                self.pa = pyaudio.PyAudio()
+            self.inputs = []
+            for i in range(self.pa.get_device_count()):
+                info = self.pa.get_device_info_by_index(i)
+                if info['maxInputChannels'] > 0:
+                    self.inputs.append(info)
+            self.refreshed_at = time.monotonic()
+
+    def _ensure_fresh(self, force=False):
+        with self.lock:
+            stale = self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.refresh_seconds
+            if force or stale:
+                self.refresh()
+
+    def list_devices(self, refresh=False):
+        """
+        :return: dict of device names to their number of channels and native sample rate, for the default host API
+        """
+        self._ensure_fresh(refresh)
+        return {
+            info['name']: {"n_channels": info['maxInputChannels'], "sample_rate": int(info['defaultSampleRate'])}
+            for info in self.inputs if info['hostApi'] == 0
+        }
+
+    def find(self, name):
+        """
+        :return: PortAudio device info of the first input device whose name contains name
+        """
+        self._ensure_fresh()
+        for _ in range(2):
+            for info in self.inputs:
+                if name.lower() in info.get('name', '').lower():
+                    return info
+            # Might have just been plugged in
+            self.refresh()
+        raise ValueError(f"Audio device '{name}' not found")
+
+    def acquire(self):
+        """
+        :return: the shared PyAudio instance, kept alive until release() is called
+        """
+        with self.lock:
+            self._ensure_fresh()
+            self.leases += 1
+            return self.pa
+
+    def release(self):
+        with self.lock:
+            self.leases -= 1
+
+device_registry = DeviceRegistry()
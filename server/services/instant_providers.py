@@ -0,0 +1,193 @@
+import time
+import queue
+import threading
+from collections import deque
+import numpy as np
+import instructor
+from library.config import get_config
+from library.metrics import PROVIDER_HEDGES, PROVIDER_FAILOVERS
+from services.provider_scheduler import create_client, get_scheduler, QUEUE_TIMEOUT, CANCEL_POLL_SECONDS, RequestCancelled, ProviderQueueTimeout
+
+config = get_config()
+
+# Other providers serving the instant model, tried in order after INSTANT_BASE_URL
+INSTANT_FALLBACKS = config.get('INSTANT_FALLBACKS', [])
+# Send the request to the next provider too when the first token takes longer than
+# HEDGE_PERCENTILE of the primary's recent first token times
+HEDGE_REQUESTS = config.get('HEDGE_REQUESTS', False)
+HEDGE_PERCENTILE = config.get('HEDGE_PERCENTILE', 95)
+HEDGE_MIN_DELAY = config.get('HEDGE_MIN_DELAY', .3)
+HEDGE_MAX_DELAY = config.get('HEDGE_MAX_DELAY', 5)
+# Used until there are enough samples for the percentile
+HEDGE_DEFAULT_DELAY = config.get('HEDGE_DEFAULT_DELAY', 1)
+HEDGE_MIN_SAMPLES = 20
+
+class InstantProvider:
+    def __init__(self, name, base_url, api_key, model):
+        self.name = name
+        self.model = model
+        self.client = create_client(name, base_url, api_key)
+        self.instructor_client = instructor.from_openai(self.client)
+        self.scheduler = get_scheduler(name)
+        # kind -> recent seconds to the first token (or the whole response when not streaming)
+        self.latencies = {}
+
+    def record_latency(self, kind, seconds):
+        self.latencies.setdefault(kind, deque(maxlen=200)).append(seconds)
+
+    def hedge_delay(self, kind):
+        samples = self.latencies.get(kind)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, float(np.percentile(samples, HEDGE_PERCENTILE))))
+
+class InstantProviders:
+    """
+    The instant model behind one or more providers. A call goes to the primary, fails over
+    to the next provider when it errors, and with HEDGE_REQUESTS is also sent to the next
+    provider when the primary is slower than usual to start answering. Whichever starts
+    answering first wins and the other stream is closed.
+
+    Calls are blocking like the OpenAI client, each attempt runs on its own thread. Setting
+    the cancel event closes the streams and raises RequestCancelled.
+    """
+    def __init__(self, providers):
+        self.providers = providers
+
+    def complete(self, priority, kind, messages, cancel=None, **kwargs):
+        """
+        :return: the completion's text
+        """
+        def attempt(provider, first_token, cancelled, queue_timeout):
+            start = time.perf_counter()
+            stream = provider.scheduler.call(
+                priority, kind, provider.client.chat.completions.create, queue_timeout, cancelled,
+                model=provider.model, messages=messages, stream=True, **kwargs,
+            )
+            parts = []
+            try:
+                for chunk in stream:
+                    if cancelled.is_set():
+                        return None
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if not parts:
+                            provider.record_latency(kind, time.perf_counter() - start)
+                            first_token()
+                        parts.append(chunk.choices[0].delta.content)
+            finally:
+                stream.close()
+            return ''.join(parts)
+        return self._run(kind, attempt, cancel)
+
+    def create(self, priority, kind, response_model, messages, cancel=None, **kwargs):
+        """
+        Structured output through instructor, hedged on the whole response since it isn't streamed
+        :return: a response_model instance
+        """
+        def attempt(provider, first_token, cancelled, queue_timeout):
+            start = time.perf_counter()
+            result = provider.scheduler.call(
+                priority, kind, provider.instructor_client.chat.completions.create, queue_timeout, cancelled,
+                model=provider.model, messages=messages, response_model=response_model, **kwargs,
+            )
+            provider.record_latency(kind, time.perf_counter() - start)
+            return result
+        return self._run(kind, attempt, cancel)
+
+    def _run(self, kind, attempt, cancel=None):
+        events = queue.Queue()
+        cancelled = [threading.Event() for _ in self.providers]
+        running = set()
+        winner = None
+        error = None
+
+        def run(i, event_cancelled, queue_timeout):
+            try:
+                result = attempt(self.providers[i], lambda: events.put((i, "first_token", None)), event_cancelled, queue_timeout)
+            except RequestCancelled:
+                result = None
+            except Exception as e:
+                events.put((i, "error", e))
+                return
+            events.put((i, "cancelled" if event_cancelled.is_set() else "done", result))
+
+        def launch(i, queue_timeout=QUEUE_TIMEOUT):
+            # Fresh event, the slot may have been cancelled while another provider was answering
+            cancelled[i] = threading.Event()
+            running.add(i)
+            threading.Thread(target=run, args=(i, cancelled[i], queue_timeout), daemon=True, name=f"provider-{self.providers[i].name}").start()
+
+        launch(0)
+        launched = 1
+        hedged = hedge_tried = False
+        hedge_at = time.monotonic() + self.providers[0].hedge_delay(kind)
+        while True:
+            if cancel is not None and cancel.is_set():
+                for event_cancelled in cancelled:
+                    event_cancelled.set()
+                raise RequestCancelled()
+            timeout = None
+            hedge_pending = HEDGE_REQUESTS and not hedge_tried and winner is None and launched == 1 and len(self.providers) > 1
+            if hedge_pending:
+                timeout = max(0, hedge_at - time.monotonic())
+            if cancel is not None:
+                timeout = CANCEL_POLL_SECONDS if timeout is None else min(timeout, CANCEL_POLL_SECONDS)
+            try:
+                i, event, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                if not hedge_pending or time.monotonic() < hedge_at:
+                    continue
+                # Primary is slow, race it against the next provider if that has quota right now
+                launch(1, queue_timeout=0)
+                launched, hedged, hedge_tried = 2, True, True
+                continue
+
+            if event == "first_token" and winner is None:
+                winner = i
+            elif event == "done" and winner in (None, i):
+                if hedged:
+                    PROVIDER_HEDGES.labels(kind, "primary" if i == 0 else "secondary").inc()
+                winner = i
+                running.discard(i)
+            elif event in ("done", "cancelled"):
+                running.discard(i)
+            elif event == "error" and hedged and i == 1 and isinstance(payload, ProviderQueueTimeout):
+                # No quota for the hedge right now, that's not a failure. The provider is still
+                # next in line if the primary fails
+                running.discard(i)
+                hedged = False
+                if launched == 2:
+                    launched = 1
+                    if not running:
+                        # The primary failed in the meantime, wait for quota this time
+                        PROVIDER_FAILOVERS.labels(self.providers[1].name, kind).inc()
+                        launch(1)
+                        launched = 2
+            elif event == "error":
+                running.discard(i)
+                error = error or payload
+                if winner == i:
+                    winner = None
+                print(f"Instant provider {self.providers[i].name} failed for {kind}: {payload}")
+                if launched < len(self.providers):
+                    PROVIDER_FAILOVERS.labels(self.providers[launched].name, kind).inc()
+                    launch(launched)
+                    launched += 1
+
+            # The other running attempts lose as soon as one starts answering
+            if winner is not None:
+                for j in running:
+                    if j != winner:
+                        cancelled[j].set()
+            if event == "done" and winner == i:
+                return payload
+            if not running:
+                raise error
+
+def create_instant_providers():
+    providers = [InstantProvider("instant", config['INSTANT_BASE_URL'], config['INSTANT_API_KEY'], config['INSTANT_MODEL'])]
+    for i, fallback in enumerate(INSTANT_FALLBACKS):
+        providers.append(InstantProvider(fallback.get('NAME', f"instant:{i + 1}"), fallback['BASE_URL'], fallback['API_KEY'], fallback.get('MODEL', config['INSTANT_MODEL'])))
+    return InstantProviders(providers)
+
+instant_providers = create_instant_providers()
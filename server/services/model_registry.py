@@ -0,0 +1,98 @@
+import time
+import threading
+from library.config import get_config
+
+config = get_config()
+
+class ModelRegistry:
+    """
+    Loads models on first use (or in a background warmup thread) and shares
+    one instance per model across routers and services.
+    """
+    def __init__(self):
+        self.loaders = {}
+        self.models = {}
+        self.states = {}
+        self.locks = {}
+
+    def register(self, name, loader):
+        self.loaders[name] = loader
+        self.locks[name] = threading.Lock()
+        self.states[name] = {"state": "not_loaded", "load_seconds": None, "error": None}
+
+    def get(self, name):
+        """
+        Blocks until the model is loaded, call it off the event loop
+        """
+        if name in self.models:
+            return self.models[name]
+        with self.locks[name]:
+            if name in self.models:
+                return self.models[name]
+            self.states[name] = {"state": "loading", "load_seconds": None, "error": None}
+            start = time.perf_counter()
+            try:
+                model = self.loaders[name]()
+            except Exception as e:
+                self.states[name] = {"state": "failed", "load_seconds": None, "error": str(e)}
+                raise
+            self.models[name] = model
+            self.states[name] = {"state": "ready", "load_seconds": round(time.perf_counter() - start, 3), "error": None}
+            return model
+
+    def is_ready(self, name):
+        return name in self.models
+
+    def warmup(self, names):
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Failed to load model {name}: {e}")
+        thread = threading.Thread(target=load_all, daemon=True, name="model-warmup")
+        thread.start()
+        return thread
+
+    def status(self):
+        return {name: dict(state) for name, state in self.states.items()}
+
+def get_torch_device():
+    import torch
+    return "cuda" if torch.backends.cuda.is_built() else "cpu"
+
+def load_asr(model_name):
+    from services.asr_backends import create_asr_backend
+    return create_asr_backend(model_name)
+
+def load_diarization():
+    import torch
+    from pyannote.audio import Pipeline
+    pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=config.get("HUGGINGFACE_TOKEN", ""))
+    pipeline.to(torch.device(get_torch_device()))
+    return pipeline
+
+def load_speaker_embedding():
+    # The embedding model speaker-diarization-3.1 clusters with, one embedding per excerpt
+    import torch
+    from pyannote.audio import Model, Inference
+    model = Model.from_pretrained("pyannote/wespeaker-voxceleb-resnet34-LM", use_auth_token=config.get("HUGGINGFACE_TOKEN", ""))
+    return Inference(model, window="whole", device=torch.device(get_torch_device()))
+
+def asr_registry_name(tier=None):
+    """
+    :return: registry name of the ASR backend for a meeting's tier, "asr" is the default model
+    """
+    if tier is None:
+        return "asr"
+    if f"asr:{tier}" not in registry.loaders:
+        raise ValueError(f"Unknown ASR tier '{tier}'")
+    return f"asr:{tier}"
+
+registry = ModelRegistry()
+registry.register("asr", lambda: load_asr(config.get('ASR_MODEL', 'turbo')))
+# Smaller models selectable per meeting, e.g. {"fast": "base.en"}
+for tier, model_name in config.get('ASR_TIERS', {}).items():
+    registry.register(f"asr:{tier}", lambda model_name=model_name: load_asr(model_name))
+registry.register("diarization", load_diarization)
+registry.register("speaker_embedding", load_speaker_embedding)
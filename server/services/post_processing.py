@@ -1,25 +1,35 @@
 import asyncio
-import yaml
 from library.prompts import SummarizePrompt
-from openai import OpenAI
+from library.config import get_config
+from services.provider_scheduler import BACKGROUND
+from services.instant_providers import instant_providers
+from services.speakers import load_waveform, label_enrolled, concatenate_segments, SAMPLE_RATE
 
-# Load the configuration from config.yaml
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
+config = get_config()
 
-# Extract the API keys and models
-INSTANT_API_KEY = config['INSTANT_API_KEY']
-INSTANT_BASE_URL = config['INSTANT_BASE_URL']
-INSTANT_MODEL = config['INSTANT_MODEL']
+def overlap_label(diarization, start, end):
+    """
+    :return: the diarization label that overlaps start to end the most, "Unknown" if none does
+    """
+    speaker = "Unknown"
+    max_overlap = 0
+    for turn, _, label in diarization.itertracks(yield_label=True):
+        overlap = max(0, min(end, turn.end) - max(start, turn.start))
+        if overlap > max_overlap:
+            max_overlap = overlap
+            speaker = label
+    return speaker
 
 # Mock async functions for diarization and summarization
-async def diarize(audio_file, whisper_model, diarization_pipeline):
-    # --- Step 1: Run Diarization ---
-    diarization = diarization_pipeline(audio_file)
-
-    # --- Step 2: Run Whisper Transcription ---
-    # transcription = whisper_model.transcribe(audio_path, verbose=False, word_timestamps=True)
-    transcription = whisper_model.transcribe(
+async def diarize(audio_file, asr_backend, get_pipeline, embedding_model=None, enrolled=None):
+    """
+    :param get_pipeline: blocking, returns the diarization pipeline. Only called for segments no enrolled speaker matched
+    :param enrolled: (names, embeddings) from speakers.get_enrolled, segments matching one are labeled with its name
+    """
+    # --- Step 1: Run Whisper Transcription ---
+    # Both models are blocking, run them off the event loop
+    transcription = await asyncio.to_thread(
+        asr_backend.transcribe_locked,
         audio_file,
         verbose=False,
         logprob_threshold=-.4,
@@ -27,26 +37,40 @@ async def diarize(audio_file, whisper_model, diarization_pipeline):
         word_timestamps=True,  # Enable word-level timestamps
         hallucination_silence_threshold=1.0  # Skip silent periods longer than 2.0 seconds
     )
+    segments = transcription['segments']
+
+    # --- Step 2: Label segments of enrolled speakers by embedding similarity ---
+    labels = [None] * len(segments)
+    waveform = None
+    if embedding_model is not None and enrolled and len(enrolled[0]):
+        waveform = await asyncio.to_thread(load_waveform, audio_file)
+        labels = await asyncio.to_thread(label_enrolled, embedding_model, waveform, segments, *enrolled)
+
+    # --- Step 3: Run Diarization on what's left ---
+    remainder = [i for i, label in enumerate(labels) if label is None]
+    if remainder:
+        diarization_pipeline = await asyncio.to_thread(get_pipeline)
+        if len(remainder) == len(segments):
+            diarization = await asyncio.to_thread(diarization_pipeline, audio_file)
+            spans = [(segment['start'], segment['end']) for segment in segments]
+        else:
+            # Only the unlabeled segments, back to back, which is usually a fraction of the recording
+            import torch
+            audio, spans = concatenate_segments(waveform, [segments[i] for i in remainder])
+            diarization = await asyncio.to_thread(diarization_pipeline, {"waveform": torch.from_numpy(audio)[None], "sample_rate": SAMPLE_RATE})
+        for i, (start, end) in zip(remainder, spans):
+            labels[i] = overlap_label(diarization, start, end)
+    print(f"Diarized {audio_file}: {len(segments) - len(remainder)} of {len(segments)} segments matched enrolled speakers")
 
     result = []
     current_speaker = None
     current_text = []
 
-    for segment in transcription['segments']:
+    for segment, speaker in zip(segments, labels):
         start = segment['start']
         end = segment['end']
         text = segment['text'].strip()
 
-        # Find the speaker label that overlaps the most with this segment
-        speaker = "Unknown"
-        max_overlap = 0
-
-        for turn, _, label in diarization.itertracks(yield_label=True):
-            overlap = max(0, min(end, turn.end) - max(start, turn.start))
-            if overlap > max_overlap:
-                max_overlap = overlap
-                speaker = label
-
         if current_speaker is None:
             current_speaker = speaker
             current_text.append((start, end, text))
@@ -56,6 +80,8 @@ async def diarize(audio_file, whisper_model, diarization_pipeline):
             # Append the current speaker's text
             result.append({
                 "speaker": current_speaker,
+                "start": current_text[0][0],
+                "end": current_text[-1][1],
                 "text": ' '.join([t[2] for t in current_text])
             })
             # Reset for the new speaker
@@ -66,23 +92,18 @@ async def diarize(audio_file, whisper_model, diarization_pipeline):
     if current_text:
         result.append({
             "speaker": current_speaker,
+            "start": current_text[0][0],
+            "end": current_text[-1][1],
             "text": ' '.join([t[2] for t in current_text])
         })
 
     return result
 
 async def summarize(transcript):
-    client = OpenAI(base_url = INSTANT_BASE_URL, api_key = INSTANT_API_KEY)
     prompt_object = SummarizePrompt(transcript)
     messages = prompt_object.get_messages()
 
-    # Send to client
-    response = client.chat.completions.create(
-        model=INSTANT_MODEL,
-        stream=False,
-        messages=messages,
-    )
-
-    response_message = response.choices[0].message.content if response.choices else ""
+    # Send to the instant model, the client is blocking and may wait for quota behind interactive calls
+    response_message = await asyncio.to_thread(instant_providers.complete, BACKGROUND, "summarize", messages)
 
     return response_message
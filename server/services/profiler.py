@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter
+from library.config import get_config
+from library.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+config = get_config()
+
+PROFILE_MAX_SECONDS = config.get('PROFILE_MAX_SECONDS', 60)
+# Log the event loop's stack when it doesn't get to run for this long
+LOOP_LAG_THRESHOLD = config.get('LOOP_LAG_THRESHOLD', .1)
+LOOP_MONITOR_INTERVAL = .1
+STALL_STACK_FRAMES = 20
+
+# Innermost frames of threads that are waiting rather than working, left out unless idle=True
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("selectors.py", "poll"),
+    ("thread.py", "_worker"),
+    ("connection.py", "_recv"),
+    ("connection.py", "_poll"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    ("profiler.py", "_watch"),
+}
+
+class ProfilerBusy(Exception):
+    """
+    Another profile is already running in this process
+    """
+
+# Thread ident -> label, event loop threads are marked so they stand out in the flamegraph
+thread_labels = {}
+profile_lock = threading.Lock()
+code_labels = {}
+
+STDLIB = os.path.dirname(os.__file__)
+
+def short_path(filename):
+    _, site_packages, rest = filename.rpartition('site-packages' + os.sep)
+    if site_packages:
+        return rest
+    for root in (os.getcwd(), STDLIB):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+    return filename
+
+def code_label(code):
+    # Cached per code object, this is the hot part of taking a sample
+    label = code_labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+        code_labels[code] = label
+    return label
+
+def is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+def profile(seconds, hz=100, idle=False):
+    """
+    Samples the stack of every thread in this process hz times a second for seconds.
+    :return: dict with the stacks in collapsed format ("thread;outer;...;inner count" per line,
+        what flamegraph.pl and speedscope read), the number of samples and the share of
+        wall time spent sampling
+    """
+    if not profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        me = threading.get_ident()
+        interval = 1 / hz
+        stacks = Counter()
+        samples = 0
+        sampling_time = 0.0
+        start = time.monotonic()
+        next_sample = start
+        while next_sample < start + seconds:
+            sample_start = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not idle and is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(code_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(thread_labels.get(ident) or names.get(ident, str(ident)).replace(';', ':'))
+                stacks[';'.join(reversed(stack))] += 1
+            samples += 1
+            sampling_time += time.perf_counter() - sample_start
+            next_sample += interval
+            time.sleep(max(0, next_sample - time.monotonic()))
+        elapsed = time.monotonic() - start
+    finally:
+        profile_lock.release()
+    return {
+        "collapsed": ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())),
+        "samples": samples,
+        "seconds": round(elapsed, 3),
+        "overhead": round(sampling_time / elapsed, 4) if elapsed else 0,
+    }
+
+class LoopLagMonitor:
+    """
+    Measures how late an event loop wakes up from a short sleep, i.e. how long callbacks keep
+    it busy. A watchdog thread notices when the loop hasn't checked in for LOOP_LAG_THRESHOLD
+    and logs the loop thread's stack right then, which is the call that's blocking it.
+    """
+    def __init__(self, name, threshold=LOOP_LAG_THRESHOLD, interval=LOOP_MONITOR_INTERVAL):
+        self.name = name
+        self.threshold = threshold
+        self.interval = interval
+        self.loop_thread = None
+        self.heartbeat = None  # None while the loop is between checking in and sleeping again
+        self.stalled = False
+
+    def start(self, loop):
+        """
+        Can be called from any thread
+        """
+        loop.call_soon_threadsafe(lambda: loop.create_task(self._beat()))
+        threading.Thread(target=self._watch, daemon=True, name=f"loop-monitor-{self.name}").start()
+
+    async def _beat(self):
+        self.loop_thread = threading.get_ident()
+        thread_labels[self.loop_thread] = f"{threading.current_thread().name} ({self.name} event loop)"
+        while True:
+            start = time.monotonic()
+            self.heartbeat = start
+            await asyncio.sleep(self.interval)
+            self.heartbeat = None
+            lag = max(0, time.monotonic() - start - self.interval)
+            EVENT_LOOP_LAG.labels(self.name).observe(lag)
+            if lag >= self.threshold:
+                EVENT_LOOP_STALLS.labels(self.name).inc()
+                print(f"The {self.name} event loop was blocked for {lag:.3f}s")
+            self.stalled = False
+
+    def _watch(self):
+        while True:
+            time.sleep(self.threshold / 2)
+            heartbeat = self.heartbeat
+            if heartbeat is None or self.stalled or time.monotonic() - heartbeat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is not None:
+                # Once per stall, the total is logged when the loop gets to run again
+                self.stalled = True
+                stack = ''.join(traceback.format_stack(frame, limit=STALL_STACK_FRAMES))
+                print(f"The {self.name} event loop has been blocked for over {self.threshold}s in:\n{stack}")
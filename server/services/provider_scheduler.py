@@ -0,0 +1,205 @@
+import re
+import time
+import heapq
+import itertools
+import threading
+from functools import lru_cache
+import httpx
+import openai
+from openai import OpenAI
+from library.config import get_config
+from library.metrics import PROVIDER_QUEUE_SECONDS, PROVIDER_RATE_LIMITED, provider_call
+
+config = get_config()
+
+# Interactive calls (/chat, meeting chat) always go before background ones (summaries, classification, compaction)
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Per-minute budgets per provider, the free tiers are about 30 requests / 30k tokens
+PROVIDER_LIMITS = config.get('PROVIDER_LIMITS', {})
+DEFAULT_LIMITS = {"rpm": 30, "tpm": 30000}
+# Share of the budget background calls leave for interactive ones
+BACKGROUND_RESERVE = config.get('PROVIDER_BACKGROUND_RESERVE', .2)
+# Output tokens assumed when a call doesn't set max_tokens
+OUTPUT_TOKENS = config.get('PROVIDER_OUTPUT_TOKENS', 500)
+QUEUE_TIMEOUT = config.get('PROVIDER_QUEUE_TIMEOUT', 60)
+MAX_RATE_LIMIT_RETRIES = 3
+# How often queued calls check whether they were cancelled
+CANCEL_POLL_SECONDS = .25
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_SECONDS = {"ms": .001, "s": 1, "m": 60, "h": 3600}
+
+class ProviderQueueTimeout(Exception):
+    """
+    Waited longer than PROVIDER_QUEUE_TIMEOUT for provider quota
+    """
+    def __init__(self, provider, retry_after):
+        super().__init__(f"No {provider} quota available, retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+class RequestCancelled(Exception):
+    """
+    The caller gave up on the call, e.g. a newer /chat request superseded it
+    """
+
+def parse_duration(value):
+    """
+    :return: seconds in a rate limit header, "1m30.5s", "120ms" or plain seconds, None if unreadable
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = DURATION_PART.findall(value)
+        return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts) if parts else None
+
+# Images are billed by size rather than by their base64 length
+IMAGE_TOKENS = 1000
+
+def estimate_tokens(kwargs):
+    # ~4 characters per token for the prompt plus the most the completion can use,
+    # providers count max_tokens against the token budget when the request arrives
+    tokens = kwargs.get('max_tokens') or OUTPUT_TOKENS
+    for message in kwargs.get('messages', []):
+        content = message.get('content') or ''
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            tokens += len(part.get('text', '')) // 4 if part.get('type') == 'text' else IMAGE_TOKENS
+    return tokens
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve=0):
+        """
+        :return: seconds until amount is available with reserve left over, 0 if it is now
+        """
+        # A call bigger than the bucket goes through once it's full
+        needed = min(amount + reserve, self.capacity)
+        return max(0, (needed - self.level) / self.rate)
+
+class ProviderScheduler:
+    """
+    Client side rate limiting for one LLM provider. Calls wait in a priority queue for
+    request and token budget instead of failing with a 429, interactive calls ahead of
+    background ones, and background calls leave BACKGROUND_RESERVE of the budget free.
+
+    The buckets refill at the configured per-minute rates and are corrected from the
+    provider's x-ratelimit-* headers on every response, so other clients of the same
+    key are accounted for. A 429 that still gets through pauses the provider until
+    retry-after and the call is queued again.
+    """
+    def __init__(self, provider, rpm, tpm):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0
+        self.condition = threading.Condition()
+        self.waiting = []  # heap of (priority, arrival)
+        self.arrivals = itertools.count()
+
+    def _wait_time(self, priority, tokens):
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        reserve = BACKGROUND_RESERVE if priority == BACKGROUND else 0
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, reserve * self.requests.capacity),
+            self.tokens.wait_time(tokens, reserve * self.tokens.capacity),
+        )
+
+    def acquire(self, priority, tokens, timeout=QUEUE_TIMEOUT, cancelled=None):
+        ticket = (priority, next(self.arrivals))
+        start = time.monotonic()
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        raise RequestCancelled()
+                    wait = self._wait_time(priority, tokens)
+                    if self.waiting[0] == ticket and wait <= 0:
+                        break
+                    timeout_left = start + timeout - time.monotonic()
+                    if timeout_left <= 0:
+                        raise ProviderQueueTimeout(self.provider, wait or 1)
+                    # Calls behind the head wake up when it leaves the queue
+                    wait = min(wait, timeout_left) if self.waiting[0] == ticket else timeout_left
+                    self.condition.wait(min(wait, CANCEL_POLL_SECONDS) if cancelled is not None else wait)
+                self.requests.level -= 1
+                self.tokens.level -= tokens
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+        PROVIDER_QUEUE_SECONDS.labels(self.provider, "interactive" if priority == INTERACTIVE else "background").observe(time.monotonic() - start)
+
+    def update_from_headers(self, headers):
+        """
+        Response hook, remaining counts from the provider replace our estimates when lower
+        """
+        now = time.monotonic()
+        with self.condition:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                if remaining is None:
+                    continue
+                bucket.refill(now)
+                bucket.level = min(bucket.level, float(remaining))
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                if float(remaining) < 1 and reset:
+                    self.paused_until = max(self.paused_until, now + reset)
+            retry_after = parse_duration(headers.get('retry-after'))
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            self.condition.notify_all()
+
+    def call(self, priority, kind, create, queue_timeout=QUEUE_TIMEOUT, cancelled=None, **kwargs):
+        """
+        Runs create(**kwargs), a blocking client call, once there is quota for it
+        :param kind: label for the provider metrics, e.g. chat or summarize
+        :param queue_timeout: seconds to wait for quota, 0 to only call if there is some now
+        :param cancelled: threading.Event, raises RequestCancelled instead of calling once it's set
+        """
+        tokens = estimate_tokens(kwargs)
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.acquire(priority, tokens, queue_timeout, cancelled)
+            try:
+                with provider_call(self.provider, kind):
+                    return create(**kwargs)
+            except openai.RateLimitError:
+                # update_from_headers already paused the provider until retry-after
+                PROVIDER_RATE_LIMITED.labels(self.provider).inc()
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+
+@lru_cache(maxsize=None)
+def get_scheduler(provider):
+    # Each API worker gets an equal share of the budget
+    limits = {**DEFAULT_LIMITS, **PROVIDER_LIMITS.get(provider, {})}
+    workers = config.get('WORKERS', 1) if config.get('SESSION_REGISTRY', 'local') == 'supervisor' else 1
+    return ProviderScheduler(provider, limits['rpm'] / workers, limits['tpm'] / workers)
+
+def create_client(provider, base_url, api_key):
+    """
+    OpenAI client whose responses update the provider's scheduler. Retries are left to
+    ProviderScheduler.call so they wait in the queue like everything else.
+    """
+    scheduler = get_scheduler(provider)
+    http_client = httpx.Client(event_hooks={"response": [lambda response: scheduler.update_from_headers(response.headers)]})
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
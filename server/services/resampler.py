@@ -0,0 +1,52 @@
+from math import gcd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler for int16 blocks, e.g. a 48kHz or 44.1kHz device to 16kHz.
+    Conceptually upsamples by up, low-pass filters and keeps every down-th sample, but only the
+    filter taps that land on real input samples are computed: output n uses phase (n * down) % up
+    of the filter against the inputs ending at (n * down) // up. The last taps - 1 input samples
+    are carried over so consecutive blocks are filtered as one signal.
+    """
+    def __init__(self, in_rate, out_rate, half_width=10, beta=5.0):
+        g = gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+
+        # Windowed sinc low-pass at the lower of the two Nyquist frequencies, at the upsampled rate
+        factor = max(self.up, self.down)
+        length = 2 * half_width * factor + 1
+        self.taps = -(-length // self.up)
+        m = np.arange(self.taps * self.up) - (length - 1) / 2
+        h = np.sinc(m / factor)
+        h[:length] *= np.kaiser(length, beta)
+        h[length:] = 0
+        h *= self.up / h.sum()
+        # phases[p, i] is the tap applied to input base - (taps - 1 - i), so rows line up with windows
+        self.phases = h.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32)
+
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.consumed = 0  # input samples seen
+        self.produced = 0  # output samples emitted
+
+    def process(self, samples):
+        """
+        :return: int16 output samples for a block of int16 input samples
+        """
+        start = self.consumed
+        self.consumed += len(samples)
+        signal = np.concatenate((self.history, samples.astype(np.float32)))
+        self.history = signal[len(signal) - (self.taps - 1):]
+
+        # Every output whose last input sample has arrived
+        end = -(-self.consumed * self.up // self.down)
+        positions = np.arange(self.produced, end, dtype=np.int64) * self.down
+        self.produced = end
+        windows = sliding_window_view(signal, self.taps)[positions // self.up - start]
+        if self.up == 1:
+            out = windows @ self.phases[0]
+        else:
+            out = np.einsum('ij,ij->i', windows, self.phases[positions % self.up])
+        return np.clip(out, -32768, 32767).astype(np.int16)
@@ -0,0 +1,243 @@
+import os
+import time
+import asyncio
+import threading
+from functools import lru_cache
+from multiprocessing.managers import BaseManager
+from services.audio_service import AudioService
+from services.capture_sources import FileReplaySource, SharedMemorySource, load_audio_file
+from services.model_registry import registry, asr_registry_name
+from services.classifier import speculative_classifier, SPECULATIVE_CLASSIFY
+from services.profiler import LoopLagMonitor, profile
+from library.config import get_config
+
+config = get_config()
+
+SESSION_REGISTRY = config.get('SESSION_REGISTRY', 'local')
+SUPERVISOR_ADDRESS = config.get('SESSION_SUPERVISOR_ADDRESS', '127.0.0.1:50070')
+CAPTURE_PROCESS = config.get('CAPTURE_PROCESS', False)
+
+def filter_segments(segments, start, end, seq_start, seq_end, speaker, limit):
+    # In-memory equivalent of the transcript_segments query, used for live meetings
+    result = []
+    for segment in segments:
+        if start is not None and segment['end'] < start:
+            continue
+        if end is not None and segment['start'] > end:
+            continue
+        if seq_start is not None and segment['seq'] < seq_start:
+            continue
+        if seq_end is not None and segment['seq'] >= seq_end:
+            continue
+        if speaker is not None and segment.get('speaker') != speaker:
+            continue
+        result.append(segment)
+        if len(result) >= limit:
+            break
+    return result
+
+@lru_cache(maxsize=4)
+def load_replay(path, mtime, sample_rate):
+    # Concurrent copies of a replay share the decoded samples, mtime invalidates the cache
+    return load_audio_file(path, sample_rate)
+
+class SessionHost:
+    """
+    Owns the live AudioServices, one per meeting, and runs their transcription loops on
+    its own event loop thread. Methods are synchronous, thread safe and only take and
+    return plain data, so the same object serves a single API process directly or
+    several API workers through the session supervisor.
+    """
+    def __init__(self):
+        self.services = {}
+        self.lock = threading.Lock()
+        self.recovery_claimed = False
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="session-loop")
+        self.thread.start()
+        # The transcription loops share this loop, one blocking call stalls every meeting
+        LoopLagMonitor("session").start(self.loop)
+
+    def start(self, meeting_id, audio_device_info, segments=None, asr_tier=None, replay=None):
+        """
+        Starts transcribing a meeting. Blocks while the ASR model loads.
+        replay: dict with path, speed and loop to feed the meeting from an audio file instead of devices
+        """
+        asr_backend = registry.get(asr_registry_name(asr_tier))
+        source = None
+        if CAPTURE_PROCESS:
+            source = SharedMemorySource(audio_device_info, 16000, 1024, replay=replay)
+        elif replay:
+            samples = load_replay(replay['path'], os.path.getmtime(replay['path']), 16000)
+            source = FileReplaySource(replay['path'], 16000, 1024, replay['speed'], replay['loop'], samples=samples)
+        on_commit = speculative_classifier.submit if SPECULATIVE_CLASSIFY else None
+        service = AudioService(audio_device_info, asr_backend, meeting_id, segments=segments, source=source, on_commit=on_commit)
+        with self.lock:
+            if meeting_id in self.services:
+                raise ValueError(f"Meeting {meeting_id} is already running")
+            self.services[meeting_id] = service
+        speculative_classifier.start(meeting_id)
+        asyncio.run_coroutine_threadsafe(service.start(), self.loop)
+
+    def stop(self, meeting_id):
+        """
+        :return: dict with the final transcript, segments and capture stats, None if the meeting wasn't running
+        """
+        with self.lock:
+            service = self.services.pop(meeting_id, None)
+        if not service:
+            return None
+        service.stop()
+        speculative_classifier.forget(meeting_id)
+        return {
+            "transcript": service.get_transcription(),
+            "segments": service.segments,
+            "capture": service.capture_stats(),
+        }
+
+    def is_active(self, meeting_id):
+        return meeting_id in self.services
+
+    def meeting_ids(self):
+        return list(self.services)
+
+    def transcription(self, meeting_id):
+        """
+        :return: live transcript, None if the meeting isn't running
+        """
+        service = self.services.get(meeting_id)
+        return service.get_transcription() if service else None
+
+    def live_state(self, meeting_id):
+        """
+        :return: dict with the live transcript and transcription status, None if the meeting isn't running
+        """
+        service = self.services.get(meeting_id)
+        if not service:
+            return None
+        return {"transcript": service.get_transcription(), "status": service.transcription_status()}
+
+    def words(self, meeting_id, start, end=None):
+        """
+        :return: live transcript from word start to end, None if the meeting isn't running
+        """
+        service = self.services.get(meeting_id)
+        return service.slice_words(start, end) if service else None
+
+    def classification(self, meeting_id, word_index, word_end=None):
+        """
+        :return: question type of the live utterance containing words word_index to word_end if it was classified in the background
+        """
+        return speculative_classifier.lookup(meeting_id, word_index, word_end)
+
+    def segments(self, meeting_id, start=None, end=None, seq_start=None, seq_end=None, speaker=None, limit=200):
+        """
+        :return: committed segments matching the filters, None if the meeting isn't running
+        """
+        service = self.services.get(meeting_id)
+        if not service:
+            return None
+        return filter_segments(list(service.segments), start, end, seq_start, seq_end, speaker, limit)
+
+    def capture_stats(self, meeting_id):
+        service = self.services.get(meeting_id)
+        return service.capture_stats() if service else None
+
+    def transcription_status(self, meeting_id):
+        service = self.services.get(meeting_id)
+        return service.transcription_status() if service else None
+
+    def session_metrics(self):
+        """
+        :return: per-meeting counters for /metrics
+        """
+        return {
+            meeting_id: {
+                "queue_depth": service.data_queue.qsize(),
+                "audio_seconds": service.samples_seen / service.sample_rate,
+                "decode_seconds": service.decode_seconds,
+                "capture": service.capture_stats(),
+                "transcription": service.transcription_status(),
+            } for meeting_id, service in list(self.services.items())
+        }
+
+    def model_status(self):
+        return registry.status()
+
+    def profile(self, seconds, hz=100, idle=False):
+        """
+        Sampling profile of the process the sessions run in, see services.profiler.profile
+        """
+        return profile(seconds, hz, idle)
+
+    def claim_recovery(self):
+        """
+        :return: True for the first caller only, so one API worker recovers interrupted meetings
+        """
+        with self.lock:
+            claimed, self.recovery_claimed = self.recovery_claimed, True
+            return not claimed
+
+class SupervisorManager(BaseManager):
+    pass
+
+def supervisor_address():
+    host, port = SUPERVISOR_ADDRESS.rsplit(':', 1)
+    return host, int(port)
+
+def supervisor_authkey():
+    # main.py generates one per launch and passes it to the workers through the environment
+    return (os.environ.get('SESSION_SUPERVISOR_AUTHKEY') or config.get('SESSION_SUPERVISOR_AUTHKEY', '')).encode()
+
+def serve_supervisor():
+    """
+    Entry point of the session supervisor process. Serves one SessionHost to the API
+    workers and loads the ASR models here, the workers don't need them.
+    """
+    host = SessionHost()
+    registry.warmup([name for name in config.get('WARMUP_MODELS', ['asr']) if name.startswith('asr')])
+    SupervisorManager.register('sessions', callable=lambda: host)
+    server = SupervisorManager(address=supervisor_address(), authkey=supervisor_authkey()).get_server()
+    print(f"Session supervisor listening on {SUPERVISOR_ADDRESS}")
+    server.serve_forever()
+
+class SupervisorSessions:
+    """
+    SessionHost living in the supervisor process. Connects on first use so the API
+    workers can start before the supervisor is listening.
+    """
+    def __init__(self, connect_timeout=30):
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        self.proxy = None
+
+    def _connect(self):
+        with self.lock:
+            if self.proxy is None:
+                SupervisorManager.register('sessions')
+                deadline = time.monotonic() + self.connect_timeout
+                while True:
+                    manager = SupervisorManager(address=supervisor_address(), authkey=supervisor_authkey())
+                    try:
+                        manager.connect()
+                        break
+                    except ConnectionRefusedError:
+                        if time.monotonic() > deadline:
+                            raise
+                        time.sleep(.2)
+                self.proxy = manager.sessions()
+            return self.proxy
+
+    def __getattr__(self, name):
+        # Proxies open one connection per thread, calls can come from any worker thread
+        return getattr(self.proxy or self._connect(), name)
+
+def create_session_registry():
+    if SESSION_REGISTRY == 'supervisor':
+        return SupervisorSessions()
+    if SESSION_REGISTRY != 'local':
+        raise ValueError(f"Unknown SESSION_REGISTRY '{SESSION_REGISTRY}', use local or supervisor")
+    return SessionHost()
+
+# Live meetings, every router goes through this instead of holding AudioServices itself
+sessions = create_session_registry()
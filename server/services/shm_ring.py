@@ -0,0 +1,77 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# Total samples written and the closed flag, padded to a cache line
+HEADER_BYTES = 64
+
+class SharedAudioRing:
+    """
+    Single producer, single consumer ring of int16 samples in shared memory. Hands audio
+    from the capture process to the process running ASR without pickling or a pipe.
+
+    The writer copies the samples before publishing the new total, and the reader checks
+    the total again after copying to drop anything the writer lapped while it was reading.
+    Create it with a capacity in the owning process and attach with its name elsewhere.
+    """
+    def __init__(self, capacity=None, name=None):
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity * 2)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.header = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)
+        # The size can be rounded up to a page, both sides derive the same capacity from it
+        self.capacity = (self.shm.size - HEADER_BYTES) // 2
+        self.data = np.ndarray((self.capacity,), dtype=np.int16, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def written(self):
+        return int(self.header[0])
+
+    @property
+    def closed(self):
+        return bool(self.header[1])
+
+    def mark_closed(self):
+        # No more samples are coming, the reader drains what's left and stops
+        self.header[1] = 1
+
+    def write(self, samples):
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        written = int(self.header[0])
+        start = written % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.header[0] = written + n
+
+    def read(self, position, max_samples):
+        """
+        :return: (samples, new position, samples dropped because the writer lapped the reader)
+        """
+        written = int(self.header[0])
+        dropped = max(0, written - position - self.capacity)
+        position += dropped
+        n = min(written - position, max_samples)
+        start = position % self.capacity
+        first = min(n, self.capacity - start)
+        samples = np.concatenate((self.data[start:start + first], self.data[:n - first]))
+
+        # Anything overwritten while we were copying is garbage
+        lapped = max(0, int(self.header[0]) - self.capacity - position)
+        if lapped:
+            lapped = min(lapped, n)
+            samples = samples[lapped:]
+            dropped += lapped
+        return samples, position + n, dropped
+
+    def close(self):
+        # The numpy views hold the buffer, release them before closing
+        self.header = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,88 @@
+import numpy as np
+from library.config import get_config
+from models.models import Speaker
+from services.capture_sources import load_audio_file
+
+config = get_config()
+
+SAMPLE_RATE = 16000
+# Cosine similarity to an enrolled speaker's embedding needed to label a segment with their name
+SPEAKER_MATCH_THRESHOLD = config.get('SPEAKER_MATCH_THRESHOLD', .6)
+# Shorter segments don't give a reliable embedding, they take their neighbours' label instead
+SPEAKER_MIN_SEGMENT_SECONDS = config.get('SPEAKER_MIN_SEGMENT_SECONDS', 1.0)
+
+def load_waveform(audio_file):
+    """
+    :return: mono float32 samples at 16kHz
+    """
+    return load_audio_file(audio_file, SAMPLE_RATE).astype(np.float32) / 32768.0
+
+def normalize(embedding):
+    return embedding / (np.linalg.norm(embedding) or 1)
+
+def embed_segment(embedding_model, waveform, start, end):
+    """
+    :return: L2 normalized speaker embedding of start to end seconds of the waveform
+    """
+    import torch
+    excerpt = torch.from_numpy(waveform[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])[None]
+    return normalize(np.asarray(embedding_model({"waveform": excerpt, "sample_rate": SAMPLE_RATE}), dtype=np.float32).reshape(-1))
+
+def get_enrolled(db):
+    """
+    :return: (names, (n, d) matrix of normalized embeddings) of every enrolled speaker
+    """
+    speakers = db.query(Speaker).order_by(Speaker.speaker_id).all()
+    if not speakers:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return [speaker.name for speaker in speakers], np.stack([np.frombuffer(speaker.embedding, dtype=np.float32) for speaker in speakers])
+
+def enroll(db, name, embeddings):
+    """
+    Adds embeddings to a speaker's running mean, creating the speaker if needed
+    """
+    speaker = db.query(Speaker).filter(Speaker.name == name).first()
+    total = np.sum(embeddings, axis=0)
+    if speaker:
+        total += np.frombuffer(speaker.embedding, dtype=np.float32) * speaker.n_segments
+        speaker.n_segments += len(embeddings)
+    else:
+        speaker = Speaker(name=name, n_segments=len(embeddings))
+        db.add(speaker)
+    speaker.embedding = normalize(total).astype(np.float32).tobytes()
+    return speaker
+
+def label_enrolled(embedding_model, waveform, segments, names, enrolled, threshold=SPEAKER_MATCH_THRESHOLD):
+    """
+    Fast path of diarization: labels each transcript segment with the enrolled speaker
+    whose embedding is closest, if it's close enough.
+    :return: a name or None per segment
+    """
+    labels = [None] * len(segments)
+    long_segments = [i for i, segment in enumerate(segments) if segment['end'] - segment['start'] >= SPEAKER_MIN_SEGMENT_SECONDS]
+    if long_segments and len(names):
+        embeddings = np.stack([embed_segment(embedding_model, waveform, segments[i]['start'], segments[i]['end']) for i in long_segments])
+        similarity = embeddings @ enrolled.T
+        for row, i in enumerate(long_segments):
+            best = similarity[row].argmax()
+            if similarity[row, best] >= threshold:
+                labels[i] = names[best]
+
+    # A short segment between two segments of the same speaker is almost always that speaker
+    long_indices = set(long_segments)
+    for i, segment in enumerate(segments):
+        if labels[i] is None and i not in long_indices and 0 < i < len(segments) - 1 and labels[i - 1] and labels[i - 1] == labels[i + 1]:
+            labels[i] = labels[i - 1]
+    return labels
+
+def concatenate_segments(waveform, segments):
+    """
+    :return: the segments' audio back to back, and each segment's (start, end) in it
+    """
+    pieces, spans, position = [], [], 0
+    for segment in segments:
+        piece = waveform[int(segment['start'] * SAMPLE_RATE):int(segment['end'] * SAMPLE_RATE)]
+        pieces.append(piece)
+        spans.append((position / SAMPLE_RATE, (position + len(piece)) / SAMPLE_RATE))
+        position += len(piece)
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32), spans
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import threading
+from library.config import get_config
+
+config = get_config()
+
+JOURNAL_DIR = config.get('JOURNAL_DIR', './journal/')
+JOURNAL_FSYNC_SECONDS = config.get('JOURNAL_FSYNC_SECONDS', 1)
+
+def journal_path(meeting_id):
+    return os.path.join(JOURNAL_DIR, f"{meeting_id}.jsonl")
+
+def read_journal(meeting_id):
+    """
+    :return: list of committed segments, in the order they were written
+    """
+    path = journal_path(meeting_id)
+    if not os.path.exists(path):
+        return []
+    segments = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                segments.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Torn write from a crash, everything before it is intact
+                break
+    return segments
+
+def journal_age(meeting_id):
+    """
+    :return: seconds since the meeting was last alive (the flush thread touches the journal
+        even when there's nothing to write), None if there is no journal
+    """
+    path = journal_path(meeting_id)
+    if not os.path.exists(path):
+        return None
+    return time.time() - os.path.getmtime(path)
+
+def remove_journal(meeting_id):
+    path = journal_path(meeting_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+def truncate_torn_tail(path):
+    """
+    Drop a partial last line left by a crash so appends after a resume stay readable.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+class TranscriptJournal:
+    """
+    Append-only per-meeting journal of committed transcript segments.
+    append() only buffers in memory, a background thread writes and fsyncs the
+    buffer every fsync_interval seconds so the transcription loop never waits on disk.
+    """
+    def __init__(self, meeting_id, fsync_interval=JOURNAL_FSYNC_SECONDS):
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self.meeting_id = meeting_id
+        self.fsync_interval = fsync_interval
+        truncate_torn_tail(journal_path(meeting_id))
+        self.file = open(journal_path(meeting_id), 'a', encoding='utf-8')
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    def append(self, segment):
+        with self.pending_lock:
+            self.pending.append(json.dumps(segment))
+
+    def flush(self):
+        with self.write_lock:
+            with self.pending_lock:
+                lines, self.pending = self.pending, []
+            if not lines or self.file.closed:
+                return
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _flush_loop(self):
+        while not self.closed.wait(self.fsync_interval):
+            self.flush()
+            # Heartbeat for journal_age, a quiet stretch doesn't mean the meeting is gone
+            try:
+                os.utime(journal_path(self.meeting_id))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.flush_thread.join()
+        self.flush()
+        with self.write_lock:
+            self.file.close()